@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+
+try:
+    from numba import njit
+    _HAS_NUMBA = True
+except ImportError:
+    _HAS_NUMBA = False
+
+    def njit(*args, **kwargs):
+        # Numbaなしでも同じコードパスで動くようにするダミーデコレータ
+        def wrap(func): return func
+        return wrap
+
+
+@njit(cache=True)
+def rolling_median(x, w, center):
+    """
+    スライディング窓の中央値 (pandasのrolling(min_periods=1).median()互換)。
+    ソート済みバッファを二分探索で1点ずつ入れ替えながら進むため、
+    1ステップ O(w) (memmove) で pandas のような Python/Cython 往復がない。
+    端は窓を縮めて min_periods=1 の挙動を再現する。
+    """
+    n = x.shape[0]
+    out = np.empty(n)
+    buf = np.empty(w)   # 現在窓の値をソート順で保持
+    m = 0               # バッファ内の要素数
+    cur_lo = 0
+    cur_hi = 0          # 現在バッファに入っている区間 [cur_lo, cur_hi)
+    off_l = (w // 2) if center else (w - 1)
+
+    for i in range(n):
+        lo = i - off_l
+        if lo < 0:
+            lo = 0
+        hi = (i + (w - off_l)) if center else (i + 1)
+        if hi > n:
+            hi = n
+
+        # 窓から外れた値を二分探索で除去
+        while cur_lo < lo:
+            v = x[cur_lo]
+            a, b = 0, m
+            while a < b:
+                mid = (a + b) // 2
+                if buf[mid] < v:
+                    a = mid + 1
+                else:
+                    b = mid
+            for j in range(a, m - 1):
+                buf[j] = buf[j + 1]
+            m -= 1
+            cur_lo += 1
+
+        # 窓に入った値を二分探索で挿入
+        while cur_hi < hi:
+            v = x[cur_hi]
+            a, b = 0, m
+            while a < b:
+                mid = (a + b) // 2
+                if buf[mid] < v:
+                    a = mid + 1
+                else:
+                    b = mid
+            for j in range(m, a, -1):
+                buf[j] = buf[j - 1]
+            buf[a] = v
+            m += 1
+            cur_hi += 1
+
+        if m % 2 == 1:
+            out[i] = buf[m // 2]
+        else:
+            out[i] = 0.5 * (buf[m // 2 - 1] + buf[m // 2])
+
+    return out
@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+import mmap
+import pickle
+import struct
+
+# zstandardがあれば圧縮形式 (compress=True) も書ける
+try:
+    import zstandard as zstd
+    _HAS_ZSTD = True
+except ImportError:
+    _HAS_ZSTD = False
+
+# 独自フレーム形式のマジック。先頭4バイトがこれでなければ従来のpickleとみなす
+_MAGIC = b'PKB5'
+_MAGIC_Z = b'PKZ1'  # zstd圧縮pickle
+_HEADER = struct.Struct('<QI')  # (payloadサイズ, バッファ本数)
+_BUFLEN = struct.Struct('<Q')
+
+
+def dump(obj, path, compress=False):
+    """
+    numpy配列をprotocol 5のout-of-bandバッファとして分離保存する。
+    レイアウト: MAGIC | header | 各バッファ長 | pickle本体 | バッファ列。
+    load()側でファイルをmmapし、配列をコピーなしでビューとして復元できる。
+
+    compress=True かつ zstandard 導入済みならzstd圧縮pickleで書く。
+    スペクトログラムのような構造的なデータは2〜4倍に縮むが、load()は
+    全展開になる (mmapゼロコピーは効かない) ため用途で選ぶこと。
+    zstandardがなければ黙って無圧縮フレーム形式にフォールバックする。
+    """
+    if compress and _HAS_ZSTD:
+        payload = pickle.dumps(obj, protocol=5)
+        with open(path, 'wb') as f:
+            f.write(_MAGIC_Z)
+            f.write(zstd.ZstdCompressor(level=3).compress(payload))
+        return
+
+    buffers = []
+    payload = pickle.dumps(obj, protocol=5, buffer_callback=buffers.append)
+    raws = [b.raw() for b in buffers]
+    with open(path, 'wb') as f:
+        f.write(_MAGIC)
+        f.write(_HEADER.pack(len(payload), len(raws)))
+        for raw in raws:
+            f.write(_BUFLEN.pack(raw.nbytes))
+        f.write(payload)
+        for raw in raws:
+            f.write(raw)
+
+
+def load(path):
+    """
+    dump()で書いたキャッシュをmmap越しにゼロコピーで読む。
+    配列データはファイルを指す読み取り専用ビューになる (メモリに
+    乗るのはアクセスしたページだけ)。旧形式 (素のpickle) のファイルは
+    マジック不一致を検出してpickle.loadにフォールバックする。
+    """
+    with open(path, 'rb') as f:
+        magic = f.read(len(_MAGIC))
+        if magic == _MAGIC_Z:
+            if not _HAS_ZSTD:
+                raise RuntimeError(
+                    "zstd圧縮キャッシュの読み込みにはzstandardが必要です")
+            return pickle.loads(zstd.ZstdDecompressor().decompress(f.read()))
+        if magic != _MAGIC:
+            f.seek(0)
+            return pickle.load(f)
+
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    view = memoryview(mm)
+    off = len(_MAGIC)
+    payload_len, n_bufs = _HEADER.unpack_from(view, off)
+    off += _HEADER.size
+    buf_lens = [_BUFLEN.unpack_from(view, off + i * _BUFLEN.size)[0]
+                for i in range(n_bufs)]
+    off += n_bufs * _BUFLEN.size
+
+    payload = view[off:off + payload_len]
+    off += payload_len
+
+    buffers = []
+    for length in buf_lens:
+        buffers.append(view[off:off + length])
+        off += length
+
+    # 復元された配列がビューを参照している間はmmapも生き続ける
+    return pickle.loads(payload, buffers=buffers)
@@ -2,102 +2,300 @@
 import pandas as pd
 import numpy as np
 import os
+import json
 import pickle
-from structs import SensorData
+import hashlib
+import cache_io
+from structs import SensorBundle
+
+# pyarrowがあればキャッシュをParquet (LZ4圧縮・列単位読み出し可) で書ける
+try:
+    import pyarrow as pa
+    import pyarrow.csv as pa_csv
+    import pyarrow.parquet as pq
+    _HAS_PYARROW = True
+except ImportError:
+    _HAS_PYARROW = False
+
+_SIG_CHUNK = 65536
+_sig_memo = {}  # {path: ((mtime_ns, size), sig)}
+
+
+def file_signature(path):
+    """
+    ファイル内容の軽量署名 (サイズ + 先頭/末尾64KiBのblake2b)。
+    mtime比較と違い、rsync等でコピーされてmtimeが変わっても内容が
+    同じなら一致する。結果はmtime/sizeが変わらない限りメモ化される。
+    """
+    st = os.stat(path)
+    stat_key = (st.st_mtime_ns, st.st_size)
+    cached = _sig_memo.get(path)
+    if cached is not None and cached[0] == stat_key:
+        return cached[1]
+
+    h = hashlib.blake2b(digest_size=8)
+    h.update(str(st.st_size).encode())
+    with open(path, 'rb') as f:
+        h.update(f.read(_SIG_CHUNK))
+        if st.st_size > 2 * _SIG_CHUNK:
+            f.seek(-_SIG_CHUNK, os.SEEK_END)
+            h.update(f.read(_SIG_CHUNK))
+    sig = h.hexdigest()
+    _sig_memo[path] = (stat_key, sig)
+    return sig
+
+
+def quantize_bundle(bundle):
+    """
+    SensorBundleをint16+チャンネル別scale/offsetに量子化する。
+    センサの実精度は12〜16bit程度なので、65535段階への丸めは
+    ノイズフロアより十分細かく、キャッシュのサイズとDRAM帯域が
+    float32比で半分になる。戻り値はcache_io.dumpできる辞書。
+    """
+    values = bundle.values
+    vmin = values.min(axis=0).astype(np.float64)
+    vmax = values.max(axis=0).astype(np.float64)
+    scale = (vmax - vmin) / 65535.0
+    scale[scale == 0.0] = 1.0  # 定数チャンネルはq=0に落ちるだけ
+    q = np.empty(values.shape, dtype=np.int16, order='F')
+    tmp = (values - vmin) / scale
+    tmp -= 32768.0
+    np.rint(tmp, out=tmp)
+    q[:] = tmp
+    return {
+        'q16': q, 'scale': scale, 'offset': vmin,
+        'names': list(bundle.names), 'fs': bundle.fs, 'units': bundle.units,
+        'start_times': bundle.start_times, 'sources': bundle.sources,
+    }
+
+
+def dequantize_bundle(payload):
+    """quantize_bundle()の辞書からSensorBundle (float32) を復元する"""
+    q = payload['q16']
+    values = q.astype(np.float32, order='F')
+    values += 32768.0
+    values *= payload['scale'].astype(np.float32)
+    values += payload['offset'].astype(np.float32)
+    return SensorBundle(
+        values=values,
+        names=payload['names'],
+        fs=payload['fs'],
+        units=payload['units'],
+        start_times=payload['start_times'],
+        sources=payload['sources'],
+    )
+
 
 class DataConverter:
     def __init__(self):
         pass
 
-    def process(self, csv_path, output_dir, sensor_configs, processing_config, default_sampling_rate=None, default_start_time=0.0):
+    def _cache_signature(self, csv_path, sensor_configs):
+        """(CSV内容の署名, センサ設定ハッシュ) からキャッシュ署名を作る"""
+        cfg_hash = hashlib.blake2b(repr(sensor_configs).encode(), digest_size=8).hexdigest()
+        return f"{file_signature(csv_path)}:{cfg_hash}"
+
+    def process(self, csv_path, output_dir, sensor_configs, processing_config,
+                default_sampling_rate=None, default_start_time=0.0, return_data=False):
         """
         CSVを読み込み、SensorDataの辞書に変換して保存する。
+        return_data=True の場合は (save_path, SensorBundle) を返し、
+        呼び出し側が書いたばかりのpklを読み直さずに済むようにする
+        (キャッシュヒット等で手元にデータがない場合は (save_path, None))。
         """
         file_name = os.path.basename(csv_path)
         base_name = os.path.splitext(file_name)[0]
-        
+
+        # キャッシュ形式: 既定はpickle。processing_configで 'parquet' を
+        # 指定し、pyarrowが入っていればLZ4圧縮Parquetになる。
+        cache_format = (processing_config or {}).get('cache_format', 'pickle')
+        use_parquet = cache_format == 'parquet' and _HAS_PYARROW
+        if cache_format == 'parquet' and not _HAS_PYARROW:
+            print("  ⚠️ pyarrow未導入のためpickleキャッシュにフォールバックします")
+        ext = '.parquet' if use_parquet else '.pkl'
+        save_path = os.path.join(output_dir, base_name + ext)
+        sig_path = save_path + ".sig"
+
+        # --- キャッシュ判定 ---
+        # CSVが未変更かつセンサ設定も同一なら、パースせず既存pklを返す
+        try:
+            sig = self._cache_signature(csv_path, sensor_configs)
+            if os.path.exists(save_path) and os.path.exists(sig_path):
+                with open(sig_path, 'r') as f:
+                    if f.read().strip() == sig:
+                        print(f"  [Converter] キャッシュ有効 (再変換スキップ): {os.path.basename(save_path)}")
+                        return (save_path, None) if return_data else save_path
+        except OSError:
+            sig = None
+
         print(f"  [Converter] CSV読み込み中: {file_name}")
-        
+
+        fail = (None, None) if return_data else None
+
+        csv_engine = (processing_config or {}).get('csv_engine', 'pandas')
+
         try:
-            raw_df = self._smart_load_csv(csv_path)
-            if raw_df is None: return None
+            raw_df = self._smart_load_csv(csv_path, engine=csv_engine)
+            if raw_df is None: return fail
             
             # ★修正: CSVのカラム名一覧を表示（デバッグ用）
             print(f"    ℹ️  CSV Columns: {list(raw_df.columns)}")
             
         except Exception as e:
             print(f"  [エラー] CSV読み込み失敗: {e}")
-            return None
+            return fail
 
-        converted_dict = {}
+        converted_bundle = None
 
-        # --- 物理量変換ループ ---
+        # --- カラム解決 (係数と対象列を先にまとめる) ---
+        clean_cols = {c.strip(): c for c in raw_df.columns}
+        resolved = []  # (sensor_config, target_col)
         for sensor in sensor_configs:
             col_id = sensor.get('id')
             name = sensor.get('name')
-            
-            # カラム特定
+
             target_col = None
             if col_id in raw_df.columns:
                 target_col = col_id
-            else:
-                clean_cols = {c.strip(): c for c in raw_df.columns}
-                if col_id.strip() in clean_cols:
-                    target_col = clean_cols[col_id.strip()]
-            
+            elif col_id.strip() in clean_cols:
+                target_col = clean_cols[col_id.strip()]
+
             if target_col is None:
                 # ★修正: 見つからなかったIDを警告として表示
                 print(f"    ⚠️  [Skip] ID not found: '{col_id}' (Target: {name})")
                 continue
+            resolved.append((sensor, target_col))
 
-            # 係数計算
-            max_phys = sensor.get('max_pressure') or sensor.get('max_phys', 1.0)
-            volt_range = sensor.get('range') or sensor.get('max_volt', 10.0)
-            slope = max_phys / volt_range if volt_range != 0 else 0.0
-            offset = sensor.get('offset', 0.0)
-            
-            # 数値変換
-            raw_val = pd.to_numeric(raw_df[target_col], errors='coerce').fillna(0.0).values
-            
-            # 物理量計算
-            phys_data = raw_val * slope + offset
+        # --- 物理量変換 (全センサ分を1パスの行列演算で) ---
+        if resolved:
+            # 保存dtypeは設定可能 (既定float32: 12〜16bit ADC由来のデータに十分で、
+            # メモリ帯域とキャッシュサイズがfloat64の半分になる)
+            dtype = np.dtype((processing_config or {}).get('dtype', 'float32'))
+            slopes = np.empty(len(resolved), dtype=dtype)
+            offsets = np.empty(len(resolved), dtype=dtype)
+            for i, (sensor, _) in enumerate(resolved):
+                max_phys = sensor.get('max_pressure') or sensor.get('max_phys', 1.0)
+                volt_range = sensor.get('range') or sensor.get('max_volt', 10.0)
+                slopes[i] = max_phys / volt_range if volt_range != 0 else 0.0
+                offsets[i] = sensor.get('offset', 0.0)
 
-            # メタデータ取得
-            fs = float(sensor.get('sampling_rate', default_sampling_rate))
-            unit = sensor.get('unit', '')
-            
-            s_data = SensorData(
-                name=name,
-                data=phys_data,
-                fs=fs,
-                unit=unit,
-                start_time=default_start_time,
-                source=file_name
+            target_cols = [col for _, col in resolved]
+            raw_sub = raw_df[target_cols]
+            # read_csvのCパーサが数値型で読めた列はそのまま使い、
+            # 文字列のまま残った列だけまとめてcoerceする
+            non_numeric = [c for c in raw_sub.columns
+                           if not pd.api.types.is_numeric_dtype(raw_sub[c])]
+            if non_numeric:
+                raw_sub = raw_sub.apply(pd.to_numeric, errors='coerce')
+            raw_mat = raw_sub.fillna(0.0).to_numpy(dtype=dtype)
+            # 列優先にしておくとチャンネル切り出しが常に連続メモリになる
+            phys_mat = np.asfortranarray(raw_mat * slopes + offsets)
+
+            converted_bundle = SensorBundle(
+                values=phys_mat,
+                names=[s.get('name') for s, _ in resolved],
+                fs=np.array([float(s.get('sampling_rate', default_sampling_rate)) for s, _ in resolved]),
+                units=[s.get('unit', '') for s, _ in resolved],
+                start_times=np.full(len(resolved), default_start_time, dtype=float),
+                sources=[file_name] * len(resolved),
             )
-            converted_dict[name] = s_data
 
-        if not converted_dict:
+        if not converted_bundle or not len(converted_bundle):
             print(f"  [警告] 有効な列が見つかりませんでした: {file_name}")
-            return None
+            return fail
 
         # 保存
         os.makedirs(output_dir, exist_ok=True)
-        save_path = os.path.join(output_dir, f"{base_name}.pkl")
-        
-        with open(save_path, 'wb') as f:
-            pickle.dump(converted_dict, f)
-            
-        print(f"  [Converter] 変換保存完了: {save_path} ({len(converted_dict)} channels, t0={default_start_time})")
-        return save_path
 
-    def _smart_load_csv(self, path):
+        if use_parquet:
+            self._save_parquet(save_path, converted_bundle)
+        elif (processing_config or {}).get('cache_dtype') == 'int16':
+            # int16量子化キャッシュ: ディスク/帯域をfloat32比で半減。
+            # メモリ上のbundleは物理量のまま使い、シリアライズだけ量子化する
+            cache_io.dump(quantize_bundle(converted_bundle), save_path)
+        else:
+            # out-of-bandバッファ形式 (ローダ側でmmapゼロコピー読み出し)
+            cache_io.dump(converted_bundle, save_path)
+
+        # 署名を書いておくと次回は丸ごとスキップできる
+        if sig is not None:
+            with open(sig_path, 'w') as f:
+                f.write(sig)
+
+        print(f"  [Converter] 変換保存完了: {save_path} ({len(converted_bundle)} channels, t0={default_start_time})")
+        return (save_path, converted_bundle) if return_data else save_path
+
+    def _save_parquet(self, path, bundle):
+        """SensorBundleをParquetに書く (チャンネル=列、メタはスキーマに添付)"""
+        arrays = [pa.array(bundle.values[:, i]) for i in range(len(bundle))]
+        table = pa.Table.from_arrays(arrays, names=list(bundle.names))
+        meta = {name: {'fs': float(bundle.fs[i]),
+                       'unit': bundle.units[i],
+                       'start_time': float(bundle.start_times[i]),
+                       'source': bundle.sources[i]}
+                for i, name in enumerate(bundle.names)}
+        table = table.replace_schema_metadata({b'sensor_meta': json.dumps(meta).encode()})
+        pq.write_table(table, path, compression='lz4', use_dictionary=True)
+
+    @staticmethod
+    def load_parquet(path, columns=None):
+        """
+        ParquetキャッシュをSensorBundleとして読み戻す。
+        columns指定時はスキーマと突き合わせ、存在する列だけを読む (列プルーニング)。
+        """
+        if not _HAS_PYARROW:
+            return None
+        if columns:
+            schema_names = set(pq.read_schema(path).names)
+            columns = [c for c in columns if c in schema_names] or None
+        table = pq.read_table(path, columns=columns)
+        meta = json.loads(table.schema.metadata[b'sensor_meta'])
+        names = table.column_names
+        values = np.asfortranarray(
+            np.column_stack([table[n].to_numpy() for n in names]))
+        return SensorBundle(
+            values=values,
+            names=names,
+            fs=np.array([meta[n]['fs'] for n in names]),
+            units=[meta[n]['unit'] for n in names],
+            start_times=np.array([meta[n]['start_time'] for n in names]),
+            sources=[meta[n]['source'] for n in names],
+        )
+
+    def _smart_load_csv(self, path, engine='pandas'):
         """ヘッダー位置固定で読み込み"""
+        # pyarrow CSVはマルチスレッドで列バッファへ直接書くため、
+        # 大きい計測CSVのコールドロードが数倍速い (設定で明示的に選択)
+        if engine == 'pyarrow' and _HAS_PYARROW:
+            try:
+                table = pa_csv.read_csv(
+                    path,
+                    read_options=pa_csv.ReadOptions(
+                        # 3行目(index 2)ヘッダー、11行目からデータ開始
+                        skip_rows=2,
+                        skip_rows_after_names=7,
+                        use_threads=True,
+                        block_size=16 << 20,
+                    ),
+                )
+                df = table.to_pandas(self_destruct=True, split_blocks=True)
+                if len(df) > 0:
+                    return df
+                return None
+            except Exception:
+                pass  # pandasパスで読み直す
         try:
-            # 3行目(index 2)ヘッダー
-            df = pd.read_csv(path, header=2, low_memory=False)
-            # 11行目(index 7)からデータ開始
-            if len(df) > 7:
-                df = df.iloc[7:].reset_index(drop=True)
+            # 3行目(index 2)ヘッダー、11行目からデータ開始。
+            # 捨て行をパース後にilocで落とすのではなくCパーサ側でスキップし、
+            # 余計な型推論とコピーを省く。
+            df = pd.read_csv(
+                path,
+                header=0,
+                skiprows=lambda i: i < 10 and i != 2,
+                engine='c',
+                memory_map=True,
+            )
+            if len(df) > 0:
                 return df
             return None
         except Exception:
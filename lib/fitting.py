@@ -2,6 +2,34 @@
 import numpy as np
 from scipy.optimize import curve_fit
 
+try:
+    from numba import njit
+except ImportError:
+    def njit(*args, **kwargs):
+        # Numbaなしでも同じコードパスで動くようにするダミーデコレータ
+        def wrap(func): return func
+        return wrap
+
+
+@njit(cache=True, fastmath=True)
+def _model_core(t, w0, alpha, beta):
+    """w(t) = (w0 + alpha/beta) exp(-beta t) - alpha/beta"""
+    r = alpha / beta
+    return (w0 + r) * np.exp(-beta * t) - r
+
+
+@njit(cache=True, fastmath=True)
+def _jac_core(t, w0, alpha, beta):
+    """モデルの解析Jacobian (列: dw0, dalpha, dbeta)"""
+    e = np.exp(-beta * t)
+    r = alpha / beta
+    out = np.empty((t.shape[0], 3))
+    out[:, 0] = e
+    out[:, 1] = (e - 1.0) / beta
+    out[:, 2] = (alpha / (beta * beta)) * (1.0 - e) - t * (w0 + r) * e
+    return out
+
+
 class CoastingFitter:
     """
     コースティングダウン（減速）解析のための物理モデルとフィッティング機能を提供します。
@@ -27,10 +55,8 @@ class CoastingFitter:
         alpha: 乾性抵抗項 A/I [rad/s^2]
         beta: 粘性抵抗項 B/I [1/s]
         """
-        # オーバーフロー防止のためのクリップなどは適宜考慮
-        term1 = (w0 + alpha / beta) * np.exp(-beta * t)
-        term2 = alpha / beta
-        return term1 - term2
+        # JITコンパイル済みカーネルに委譲 (curve_fitから数百回呼ばれる)
+        return _model_core(np.asarray(t, dtype=float), w0, alpha, beta)
 
     def fit(self, t_data, y_data_rpm, fit_range=None):
         """
@@ -65,22 +91,42 @@ class CoastingFitter:
         t_relative = t_use - t_start
 
         # 3. 初期値の推定
+        # 末尾平均を漸近値 (-alpha/beta) とみなし、log(y - y_tail) の
+        # 線形回帰で beta を推定する。盲目的な固定値よりLMの反復が減る。
         w0_init = y_use_rads[0]
-        # 簡易的に beta(時定数の逆数) を推定: データ半分で減衰すると仮定
-        beta_init = 0.1 
-        alpha_init = w0_init * beta_init * 0.1 # 適当な初期値
-        
+        beta_init = 0.1
+        alpha_init = w0_init * beta_init * 0.1  # フォールバック初期値
+
+        try:
+            n_tail = max(5, len(y_use_rads) // 20)
+            y_tail = float(np.mean(y_use_rads[-n_tail:]))
+            log_decay = np.log(np.maximum(y_use_rads - y_tail, 1e-9))
+            slope, _ = np.polyfit(t_relative, log_decay, 1)
+            if slope < 0 and np.isfinite(slope):
+                beta_init = -slope
+                alpha_init = max(-y_tail * beta_init, 0.0)
+        except Exception:
+            pass  # 推定に失敗しても固定初期値で続行
+
         p0 = [w0_init, alpha_init, beta_init]
         bounds = ([0, 0, 0], [np.inf, np.inf, np.inf]) # 物理的に正の値のみ
 
+        def jac(t, w0, alpha, beta):
+            return _jac_core(np.asarray(t, dtype=float), w0, alpha, beta)
+
         try:
+            # trf + 解析Jacobian + x_scale='jac' でスケール差の大きい
+            # (w0 ~ 数百, beta ~ 0.1) パラメータでも収束が安定する
             popt, pcov = curve_fit(
-                self.model_func, 
-                t_relative, 
-                y_use_rads, 
-                p0=p0, 
+                self.model_func,
+                t_relative,
+                y_use_rads,
+                p0=p0,
+                jac=jac,
                 bounds=bounds,
-                maxfev=10000
+                method='trf',
+                x_scale='jac',
+                maxfev=2000
             )
             
             w0_opt, alpha_opt, beta_opt = popt
@@ -1,49 +1,130 @@
 # -*- coding: utf-8 -*-
 import os
-import glob
+import ast
 import re
 import cv2
 import numpy as np
 import time
 import pickle
-from concurrent.futures import ProcessPoolExecutor
-import multiprocessing
+from concurrent.futures import ThreadPoolExecutor
 from tqdm import tqdm
 from structs import SensorData
+import cache_io
+import roi_means
+
+# PyTurboJPEG (libjpeg-turbo) があればSIMDデコーダを使う。なければcv2にフォールバック。
+try:
+    from turbojpeg import TurboJPEG, TJPF_GRAY
+    _turbo_jpeg = TurboJPEG()
+except Exception:
+    _turbo_jpeg = None
+
+_frame_num_re = re.compile(r'\d+')
+
+def _list_jpg_frames(img_dir):
+    """
+    フレーム画像を番号順に列挙する。
+    glob+文字列ソートの代わりにos.scandir 1回 + 数値キーでソートし、
+    桁数が揃っていないファイル名でも正しい順序になる。
+    """
+    entries = []
+    with os.scandir(img_dir) as it:
+        for e in it:
+            if not e.name.endswith('.jpg'):
+                continue
+            nums = _frame_num_re.findall(e.name)
+            idx = int(nums[-1]) if nums else -1
+            entries.append((idx, e.name, e.path))
+    entries.sort(key=lambda t: (t[0], t[1]))
+    return [path for _, _, path in entries]
+
+def _decode_gray(buf):
+    """JPEGバイト列をグレースケール画像にデコードする"""
+    if _turbo_jpeg is not None:
+        try:
+            img = _turbo_jpeg.decode(buf, pixel_format=TJPF_GRAY)
+            return img[:, :, 0] if img.ndim == 3 else img
+        except Exception:
+            pass  # 壊れたファイル等はcv2側の判定に任せる
+    return cv2.imdecode(np.frombuffer(buf, dtype=np.uint8), cv2.IMREAD_GRAYSCALE)
+
+# --- ワーカー関数 ---
+def _parse_roi_specs(roi_list):
+    """
+    ROI設定を一度だけ数値化する。
+    戻り値: (raw_rois, valid_mask)
+      raw_rois: (N, 4) int配列 [x, y, w, h]。roi未指定は全面ROI扱い (w=h=-1)。
+      valid_mask: パース失敗したROIはFalse (結果は常にNaN)
+    """
+    n = len(roi_list)
+    raw = np.zeros((n, 4), dtype=np.int64)
+    valid = np.ones(n, dtype=bool)
+    for i, item in enumerate(roi_list):
+        roi = item['roi']
+        if not roi:
+            raw[i] = (0, 0, -1, -1)  # 全面ROI (クリップ時に画像サイズへ展開)
+            continue
+        try:
+            if isinstance(roi, str): roi = ast.literal_eval(roi)
+            raw[i] = [int(v) for v in roi]
+        except:
+            valid[i] = False
+    return raw, valid
+
+def _clip_rois(raw_rois, w_img, h_img):
+    """
+    生ROI [x,y,w,h] を画像サイズでクリップし [x_s,y_s,x_e,y_e] にする。
+    面積0になったROIは zero_mask=True (旧実装の 0.0 出力を維持)。
+    """
+    rois = raw_rois.copy()
+    full = rois[:, 2] < 0  # 全面ROI指定
+    rois[full] = (0, 0, w_img, h_img)
+    x_s = np.clip(rois[:, 0], 0, w_img)
+    y_s = np.clip(rois[:, 1], 0, h_img)
+    x_e = np.clip(rois[:, 0] + rois[:, 2], 0, w_img)
+    y_e = np.clip(rois[:, 1] + rois[:, 3], 0, h_img)
+    zero_mask = (x_e <= x_s) | (y_e <= y_s)
+    return np.stack([x_s, y_s, x_e, y_e], axis=1), zero_mask
 
-# --- ワーカー関数 (変更なし) ---
 def _worker_process_batch(args):
-    file_paths, roi_list = args
-    batch_results = []
-    for img_path in file_paths:
-        frame_result = {}
+    """
+    1バッチ分のフレームを処理し、(batch_len, n_rois) のfloat32配列 (SoA) を埋める。
+    輝度は8bit平均なのでfloat32で精度は十分、転送・保存量は半分になる。
+    cv2.imdecodeとNumbaカーネルはGILを解放するのでスレッド実行で並列化できる。
+    """
+    file_paths, parsed_rois, out = args
+    raw_rois, valid_mask = parsed_rois
+    n_rois = raw_rois.shape[0]
+    # 画像サイズは実質ショット内で一定なので、直前サイズのクリップ結果だけ覚える
+    last_shape = None
+    rois_np = zero_mask = None
+
+    if out is None:
+        out = np.full((len(file_paths), n_rois), np.nan, dtype=np.float32)
+    for fi, img_path in enumerate(file_paths):
+        means = out[fi]
         try:
-            img_array = np.fromfile(img_path, dtype=np.uint8)
-            img = cv2.imdecode(img_array, cv2.IMREAD_GRAYSCALE)
-            if img is None:
-                frame_result = {item['name']: np.nan for item in roi_list}
+            with open(img_path, 'rb') as f:
+                buf = f.read()
+            img = _decode_gray(buf)
+            if img is not None:
+                if img.shape != last_shape:
+                    h_img, w_img = img.shape
+                    rois_np, zero_mask = _clip_rois(raw_rois, w_img, h_img)
+                    last_shape = img.shape
+
+                # 全ROIの平均輝度を一括計算 (Numba JIT / 積分画像)
+                roi_means.compute_means(img, rois_np, means)
+                means[zero_mask] = 0.0
+                means[~valid_mask] = np.nan
             else:
-                h_img, w_img = img.shape
-                for item in roi_list:
-                    name = item['name']
-                    roi = item['roi']
-                    val = np.nan
-                    if roi:
-                        try:
-                            if isinstance(roi, str): roi = eval(roi)
-                            x, y, w, h = map(int, roi)
-                            x_s, y_s = max(0, min(x, w_img)), max(0, min(y, h_img))
-                            x_e, y_e = max(0, min(x + w, w_img)), max(0, min(y + h, h_img))
-                            if x_e > x_s and y_e > y_s:
-                                val = np.mean(img[y_s:y_e, x_s:x_e])
-                            else: val = 0.0
-                        except: val = np.nan
-                    else: val = np.mean(img)
-                    frame_result[name] = val
+                # imdecodeは壊れたJPEGで例外ではなくNoneを返す。memmap出力は
+                # ゼロ初期化なので、明示的にNaNを書かないと欠損が輝度0.0
+                # (有効な暗データ) に化けてしまう
+                means[:] = np.nan
         except:
-            frame_result = {item['name']: np.nan for item in roi_list}
-        batch_results.append(frame_result)
-    return batch_results
+            means[:] = np.nan
+    return out
 
 class HSCAnalyzer:
     def __init__(self):
@@ -62,7 +143,7 @@ class HSCAnalyzer:
             print(f"❌ 画像フォルダなし: {base_search_dir}")
             return None
 
-        image_files = sorted(glob.glob(os.path.join(target_img_dir, "*.jpg")))
+        image_files = _list_jpg_frames(target_img_dir)
         total_frames = len(image_files)
         if total_frames == 0:
             print("❌ jpgファイルなし")
@@ -76,33 +157,49 @@ class HSCAnalyzer:
         roi_list = hsc_settings['rois']
         
         # --- 並列処理 ---
-        chunk_size = 500 
-        chunks = [image_files[i:i + chunk_size] for i in range(0, total_frames, chunk_size)]
-        task_args = [(chunk, roi_list) for chunk in chunks]
-        max_workers = min(max(1, multiprocessing.cpu_count() - 1), 8)
-        
-        results_accum = {item['name']: [] for item in roi_list}
+        # デコードもROI集計もGILを解放するのでスレッドで十分並列化でき、
+        # プロセスプールのpickle往復が丸ごと消える。
+        chunk_size = 500
+        max_workers = max(1, os.cpu_count() or 1)
+
+        roi_names = [item['name'] for item in roi_list]
+        n_rois = len(roi_list)
+
+        # ROI設定は投入前に一度だけパースし、各バッチには数値配列だけを渡す。
+        # スレッド実行なのでこの配列は全バッチで同一オブジェクトを参照共有し、
+        # タスクごとの再シリアライズは発生しない。
+        parsed_rois = _parse_roi_specs(roi_list)
+
+        # 出力先はディスクバックのmemmap (.npy) として一括確保し、
+        # 各バッチにスライスを渡して直接書かせる。長時間撮影でも
+        # 全フレーム分の輝度行列がRSSに乗らない。
+        means_path = os.path.join(save_dir, f"shot{shot_number:03d}_hsc_means.npy")
+        all_means = np.lib.format.open_memmap(
+            means_path, mode='w+', dtype=np.float32, shape=(total_frames, n_rois))
+        task_args = [
+            (image_files[i:i + chunk_size], parsed_rois, all_means[i:i + chunk_size])
+            for i in range(0, total_frames, chunk_size)
+        ]
 
         print(f"🚀 解析中 ({total_frames} frames, {len(roi_list)} ROIs)...")
         try:
-            with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
                 with tqdm(total=total_frames, unit="fr") as pbar:
                     for batch_res in executor.map(_worker_process_batch, task_args):
-                        for frame_res in batch_res:
-                            for name, val in frame_res.items():
-                                results_accum[name].append(val)
                         pbar.update(len(batch_res))
         except Exception as e:
             print(f"❌ 解析エラー: {e}")
             return None
 
+        all_means.flush()
+
         # --- SensorData化 ---
         hsc_data_store = {}
         start_t = -(pre_trig / fps)
 
-        for name, val_list in results_accum.items():
-            data_arr = np.array(val_list, dtype=float)
-            
+        for col, name in enumerate(roi_names):
+            data_arr = np.ascontiguousarray(all_means[:, col])
+
             s_data = SensorData(
                 name=name,
                 data=data_arr,
@@ -117,8 +214,8 @@ class HSCAnalyzer:
         save_name = f"shot{shot_number:03d}_hsc.pkl"
         save_path = os.path.join(save_dir, save_name)
         
-        with open(save_path, 'wb') as f:
-            pickle.dump(hsc_data_store, f)
+        # out-of-bandバッファ形式 (ローダ側でmmapゼロコピー読み出し)
+        cache_io.dump(hsc_data_store, save_path)
             
         print(f"✅ 保存完了: {save_path}")
         return save_path
@@ -146,8 +243,12 @@ class HSCAnalyzer:
 
     def _find_shot_folder(self, search_root, shot_num):
         if not os.path.exists(search_root): return None
-        subdirs = [d for d in os.listdir(search_root) if os.path.isdir(os.path.join(search_root, d))]
-        candidates = [d for d in subdirs if str(shot_num) in re.findall(r'\d+', d)]
+        # os.scandirはis_dir()のstat結果をキャッシュするのでlistdir+isdirより速い
+        shot_str = str(shot_num)
+        with os.scandir(search_root) as it:
+            candidates = [e.name for e in it
+                          if e.is_dir() and shot_str in _frame_num_re.findall(e.name)]
         if not candidates: return None
-        candidates.sort(key=len)
+        if len(candidates) > 1:
+            candidates.sort(key=len)
         return os.path.join(search_root, candidates[0])
\ No newline at end of file
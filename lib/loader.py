@@ -1,38 +1,72 @@
 # -*- coding: utf-8 -*-
 import os
-import glob
 import re
 import pickle
 import numpy as np
+from functools import cached_property
+from concurrent.futures import ThreadPoolExecutor
 
 try:
-    from .converter import DataConverter
+    import h5py
+    _HAS_H5PY = True
+except ImportError:
+    _HAS_H5PY = False
+
+try:
+    from . import cache_io
+    from .converter import DataConverter, dequantize_bundle, file_signature
     from .physics import PhysicsEngine
     from .processor import DataProcessor
-    from .structs import SensorData
+    from .structs import SensorData, SensorBundle
 except ImportError:
     import sys
     sys.path.append(os.path.dirname(os.path.abspath(__file__)))
-    from converter import DataConverter
+    import cache_io
+    from converter import DataConverter, dequantize_bundle, file_signature
     from physics import PhysicsEngine
     from processor import DataProcessor
-    from structs import SensorData
+    from structs import SensorData, SensorBundle
+
+_num_re = re.compile(r'\d+')
 
 class DataLoader:
-    TARGET_SOURCES = ['pressure', 'vibration', 'hsc']
+    TARGET_SOURCES = frozenset(['pressure', 'vibration', 'hsc'])
 
     def __init__(self, series_config, output_dir=None):
         self.series_config = series_config
         settings = series_config.get('settings', {})
         self.base_dir = settings.get('base_dir') or series_config.get('base_dir', '.')
         self.sources = series_config.get('sources', {})
-        
-        self.converter = DataConverter()
-        self.physics = PhysicsEngine()
-        self.processor = DataProcessor()
-        
+
         self.results_root = output_dir if output_dir else os.path.join(self.base_dir, "033_解析結果")
 
+        # 対象ソースは固定なので、ショットごとのフィルタを一度だけ済ませる
+        self._active_sources = [(name, info) for name, info in self.sources.items()
+                                if name in self.TARGET_SOURCES]
+
+        # ディレクトリ一覧キャッシュ {dir: (mtime_ns, [(path, shot番号集合), ...])}
+        self._dir_cache = {}
+        # ソース別キャッシュ先 (ホットパスでのjoin連鎖を省く) と作成済みディレクトリ
+        self._cache_roots = {name: self._get_cache_directory(name)
+                             for name, _ in self._active_sources}
+        self._ensured_dirs = set()
+
+    # --- ヘルパーは初回アクセス時にだけ生成する ---
+    # HSCキャッシュ読みだけのショットではConverter等は一切使われないため、
+    # 必要になるまで構築を遅らせる (生成後は属性として固定される)
+
+    @cached_property
+    def converter(self):
+        return DataConverter()
+
+    @cached_property
+    def physics(self):
+        return PhysicsEngine()
+
+    @cached_property
+    def processor(self):
+        return DataProcessor()
+
     def load_shot_data(self, spec_config, force_reload=False):
         shot_number = spec_config['shot_number']
         measurements = spec_config.get('measurements', [])
@@ -45,102 +79,90 @@ class DataLoader:
         data_store = {}
 
         # 1. 各ソースからのデータロード (CSV, HSC等)
-        for source_name, source_info in self.sources.items():
-            if source_name not in self.TARGET_SOURCES: continue
+        # ソースごとの探索・変換・pickle読みは独立したI/O主体の処理なので
+        # スレッドで並行実行し、結合だけをソース定義順にメインスレッドで行う
+        target_items = self._active_sources
 
-            cache_root = self._get_cache_directory(source_name)
-            os.makedirs(cache_root, exist_ok=True)
-            
-            print(f"[Loader] ソース: '{source_name}'")
+        def _run(name, info):
+            return self._load_one_source(
+                name, info, shot_number, measurements, processing_config,
+                default_sr, start_time_offset, force_reload)
 
-            # === HSC ===
-            if source_name == 'hsc':
-                hsc_pkl_path = os.path.join(cache_root, f"shot{shot_number:03d}_hsc.pkl")
-                if os.path.exists(hsc_pkl_path):
-                    try:
-                        with open(hsc_pkl_path, 'rb') as f:
-                            hsc_data = pickle.load(f)
-                            if isinstance(hsc_data, dict):
-                                data_store.update(hsc_data)
-                                print(f"  -> HSCデータ結合: {len(hsc_data)} items")
-                    except Exception as e:
-                        print(f"  ⚠️ HSCロード失敗: {e}")
-                continue
-
-            # === CSV系センサ ===
-            folder_name = source_info.get('folder')
-            hint = source_info.get('hint', None)
-            target_dir = os.path.join(self.base_dir, folder_name)
-            
-            csv_path = self._smart_find_file(target_dir, shot_number, hint=hint)
-            if not csv_path:
-                print(f"  ⚠️ ファイルなし: Shot {shot_number} in {folder_name}")
-                continue
-            
-            file_base = os.path.splitext(os.path.basename(csv_path))[0]
-            cache_path = os.path.join(cache_root, file_base + ".pkl")
+        # STFT/派生量キャッシュのpickle読みもソースロードと独立なので、
+        # 同じプールに載せてデコードを重ねる (結合は後段で従来どおり直列)
+        stft_dir = os.path.join(self.results_root, ".cache", "stft")
+        stft_h5 = os.path.join(stft_dir, f"shot{shot_number:03d}_stft.h5")
+        stft_pkl = os.path.join(stft_dir, f"shot{shot_number:03d}_stft.pkl")
+        if _HAS_H5PY and os.path.exists(stft_h5):
+            stft_pkl = stft_h5
+        derived_pkl_path = os.path.join(self.results_root, ".cache", "derived",
+                                        f"shot{shot_number:03d}_derived.pkl")
+        read_stft = os.path.exists(stft_pkl)
+        read_derived = not force_reload and os.path.exists(derived_pkl_path)
+
+        n_tasks = len(target_items) + int(read_stft) + int(read_derived)
+        stft_res = derived_cached = None
+        if n_tasks > 1:
+            with ThreadPoolExecutor(max_workers=n_tasks) as executor:
+                futures = [(name, executor.submit(_run, name, info))
+                           for name, info in target_items]
+                stft_fut = executor.submit(self._read_pickle, stft_pkl) if read_stft else None
+                derived_fut = (executor.submit(self._read_pickle, derived_pkl_path)
+                               if read_derived else None)
+                results = [(name, fut.result()) for name, fut in futures]
+                if stft_fut is not None: stft_res = stft_fut.result()
+                if derived_fut is not None: derived_cached = derived_fut.result()
+        else:
+            results = [(name, _run(name, info)) for name, info in target_items]
+            if read_stft: stft_res = self._read_pickle(stft_pkl)
+            if read_derived: derived_cached = self._read_pickle(derived_pkl_path)
 
-            loaded_dict = None
-            if not force_reload and self._is_cache_valid(csv_path, cache_path):
-                try:
-                    with open(cache_path, 'rb') as f:
-                        loaded_dict = pickle.load(f)
-                except: pass
-            
-            if loaded_dict is None:
-                save_path = self.converter.process(
-                    csv_path=csv_path, 
-                    output_dir=cache_root, 
-                    sensor_configs=measurements, 
-                    processing_config=processing_config,
-                    default_sampling_rate=default_sr,
-                    default_start_time=start_time_offset
-                )
-                if save_path:
-                    with open(save_path, 'rb') as f:
-                        loaded_dict = pickle.load(f)
-
-            if loaded_dict and isinstance(loaded_dict, dict):
+        for source_name, loaded_dict in results:
+            if loaded_dict:
                 data_store.update(loaded_dict)
-                loaded_keys = list(loaded_dict.keys())
                 print(f"  -> 結合: {len(loaded_dict)} items from {source_name}")
 
-        # 2. STFT解析結果のロード
-        stft_dir = os.path.join(self.results_root, ".cache", "stft")
-        stft_pkl = os.path.join(stft_dir, f"shot{shot_number:03d}_stft.pkl")
-        if os.path.exists(stft_pkl):
+        # 2. STFT解析結果のロード (読み込み自体は上の並列フェーズで実施済み)
+        if stft_res is not None:
             try:
-                with open(stft_pkl, 'rb') as f:
-                    stft_res = pickle.load(f)
-                    count = 0
-                    for key, val in stft_res.items():
-                        if 'peak_freq' in val and 't' in val:
-                            t_arr = val['t']
-                            fs_est = 1.0 / (t_arr[1] - t_arr[0]) if len(t_arr) > 1 else 1.0
-                            t0 = t_arr[0]
-                            
-                            new_name = f"{key}_PeakFreq"
-                            data_store[new_name] = SensorData(
-                                name=new_name,
-                                data=val['peak_freq'],
-                                fs=fs_est,
-                                unit="Hz",
-                                start_time=t0,
-                                source="STFT_Analysis"
-                            )
-                            
-                            new_name_p = f"{key}_PeakPower"
-                            data_store[new_name_p] = SensorData(
-                                name=new_name_p,
-                                data=val['peak_power'],
-                                fs=fs_est,
-                                unit="dB",
-                                start_time=t0,
-                                source="STFT_Analysis"
-                            )
-                            count += 2
-                    if count > 0:
-                        print(f"  -> STFT抽出データ結合: {count} items (PeakFreq, PeakPower)")
+                # 同一STFT実行由来のチャンネルはt軸を共有しているのが普通なので、
+                # fs/t0の計算は配列の同一性でメモ化し、結合はupdate 1回にまとめる
+                extracted = {}
+                last_t_id = None
+                fs_est = t0 = 0.0
+                for key, val in stft_res.items():
+                    if 'peak_freq' in val and 't' in val:
+                        t_arr = val['t']
+                        if id(t_arr) != last_t_id:
+                            # .item()でPython floatに落としておくと、以後の
+                            # SensorData.time等の算術が0次元ndarrayの
+                            # ディスパッチを踏まない
+                            if len(t_arr) > 1:
+                                fs_est = 1.0 / (t_arr[1].item() - t_arr[0].item())
+                            else:
+                                fs_est = 1.0
+                            t0 = t_arr[0].item() if len(t_arr) else 0.0
+                            last_t_id = id(t_arr)
+
+                        extracted[f"{key}_PeakFreq"] = SensorData(
+                            name=f"{key}_PeakFreq",
+                            data=val['peak_freq'],
+                            fs=fs_est,
+                            unit="Hz",
+                            start_time=t0,
+                            source="STFT_Analysis"
+                        )
+                        extracted[f"{key}_PeakPower"] = SensorData(
+                            name=f"{key}_PeakPower",
+                            data=val['peak_power'],
+                            fs=fs_est,
+                            unit="dB",
+                            start_time=t0,
+                            source="STFT_Analysis"
+                        )
+                if extracted:
+                    data_store.update(extracted)
+                    print(f"  -> STFT抽出データ結合: {len(extracted)} items (PeakFreq, PeakPower)")
             except Exception as e:
                 print(f"  ⚠️ STFTロード警告: {e}")
 
@@ -152,28 +174,20 @@ class DataLoader:
         # 物理量計算の前に、圧力のオフセット補正などが必要なためここで実行
         pre_pipeline = spec_config.get('pre_processing', [])
         if pre_pipeline: 
-            self.processor.apply_preprocessing(data_store, pre_pipeline)
+            self.processor.apply_pipeline_fused(data_store, pre_pipeline)
 
         # 4. 物理量計算 (Derived Channels) ★ここを修正してキャッシュ対応
         derived = spec_config.get('derived_channels', {})
         if derived:
-            # キャッシュ保存先の設定
-            derived_cache_dir = os.path.join(self.results_root, ".cache", "derived")
-            os.makedirs(derived_cache_dir, exist_ok=True)
-            derived_pkl_path = os.path.join(derived_cache_dir, f"shot{shot_number:03d}_derived.pkl")
-            
+            # キャッシュ保存先の設定 (読み込みは並列フェーズで実施済み)
+            os.makedirs(os.path.dirname(derived_pkl_path), exist_ok=True)
+
             loaded_derived = False
-            
-            # キャッシュ読み込みトライ
-            if not force_reload and os.path.exists(derived_pkl_path):
-                try:
-                    with open(derived_pkl_path, 'rb') as f:
-                        derived_data = pickle.load(f)
-                        data_store.update(derived_data)
-                        print(f"  -> 派生物理量(キャッシュ)結合: {len(derived_data)} items")
-                        loaded_derived = True
-                except Exception as e:
-                    print(f"  ⚠️ 派生量キャッシュロード失敗: {e}")
+
+            if derived_cached is not None and isinstance(derived_cached, dict):
+                data_store.update(derived_cached)
+                print(f"  -> 派生物理量(キャッシュ)結合: {len(derived_cached)} items")
+                loaded_derived = True
 
             # キャッシュがない、またはロード失敗なら計算して保存
             if not loaded_derived:
@@ -189,18 +203,126 @@ class DataLoader:
                 if new_keys:
                     derived_data_to_save = {k: data_store[k] for k in new_keys}
                     try:
-                        with open(derived_pkl_path, 'wb') as f:
-                            pickle.dump(derived_data_to_save, f)
+                        # out-of-bandバッファ形式: 次回ロードはmmapゼロコピー
+                        cache_io.dump(derived_data_to_save, derived_pkl_path)
                         print(f"  💾 派生物理量を保存: {derived_pkl_path} ({len(new_keys)} items)")
                     except Exception as e:
                         print(f"  ⚠️ 派生量保存失敗: {e}")
 
         # 5. 後処理 (Post-processing)
         post_pipeline = spec_config.get('post_processing', [])
-        if post_pipeline: self.processor.apply_preprocessing(data_store, post_pipeline)
+        if post_pipeline: self.processor.apply_pipeline_fused(data_store, post_pipeline)
 
         return data_store
 
+    def _load_converted_cache(self, cache_path, measurements):
+        """変換済みキャッシュを形式 (pickle/parquet) に応じて読む"""
+        try:
+            if cache_path.endswith('.parquet'):
+                # 解析対象チャンネルだけを列プルーニングして読む
+                needed = [m.get('name') for m in measurements if m.get('name')]
+                return DataConverter.load_parquet(cache_path, columns=needed or None)
+            # 新形式はmmapゼロコピー、旧形式は内部でpickle.loadにフォールバック
+            obj = cache_io.load(cache_path)
+            if isinstance(obj, dict) and 'q16' in obj:
+                # int16量子化キャッシュはここでfloat32に復元する
+                obj = dequantize_bundle(obj)
+            return obj
+        except Exception:
+            return None
+
+    def _read_pickle(self, path):
+        """キャッシュを読み込む (壊れていたらNoneを返すだけで処理は続行)"""
+        try:
+            if path.endswith('.h5'):
+                # STFTのHDF5キャッシュ: ローダが使うpeak系列とt軸だけを
+                # 部分読み出しし、巨大なZxx/Ampはシークすらしない
+                res = {}
+                with h5py.File(path, 'r') as h5:
+                    for name, grp in h5.items():
+                        res[name] = {
+                            't': grp['t'][()],
+                            'peak_freq': grp['peak_freq'][()],
+                            'peak_power': grp['peak_power'][()],
+                        }
+                return res
+            # 新形式はmmapゼロコピー、旧形式は内部でpickle.loadにフォールバック
+            return cache_io.load(path)
+        except Exception as e:
+            print(f"  ⚠️ キャッシュロード失敗 ({os.path.basename(path)}): {e}")
+            return None
+
+    def _load_one_source(self, source_name, source_info, shot_number, measurements,
+                         processing_config, default_sr, start_time_offset, force_reload):
+        """
+        1ソース分のロード処理 (探索・キャッシュ判定・変換・pickle読み)。
+        ThreadPoolExecutorから呼ばれるため、data_storeには触らず辞書を返す。
+        """
+        cache_root = self._cache_roots.get(source_name)
+        if cache_root is None:
+            cache_root = self._get_cache_directory(source_name)
+        if cache_root not in self._ensured_dirs:
+            # ウォームロードのたびにmakedirsのsyscallを払わない
+            os.makedirs(cache_root, exist_ok=True)
+            self._ensured_dirs.add(cache_root)
+
+        print(f"[Loader] ソース: '{source_name}'")
+
+        # === HSC ===
+        if source_name == 'hsc':
+            hsc_pkl_path = os.path.join(cache_root, f"shot{shot_number:03d}_hsc.pkl")
+            if os.path.exists(hsc_pkl_path):
+                hsc_data = self._read_pickle(hsc_pkl_path)
+                if isinstance(hsc_data, dict):
+                    print(f"  -> HSCデータ読込: {len(hsc_data)} items")
+                    return hsc_data
+            return None
+
+        # === CSV系センサ ===
+        folder_name = source_info.get('folder')
+        hint = source_info.get('hint', None)
+        target_dir = os.path.join(self.base_dir, folder_name)
+
+        csv_path = self._smart_find_file(target_dir, shot_number, hint=hint)
+        if not csv_path:
+            print(f"  ⚠️ ファイルなし: Shot {shot_number} in {folder_name}")
+            return None
+
+        file_base = os.path.splitext(os.path.basename(csv_path))[0]
+        # キャッシュ形式によって拡張子が変わる (parquet優先で探す)
+        cache_path = os.path.join(cache_root, file_base + ".parquet")
+        if not os.path.exists(cache_path):
+            cache_path = os.path.join(cache_root, file_base + ".pkl")
+
+        loaded_dict = None
+        if not force_reload and self._is_cache_valid(csv_path, cache_path, measurements):
+            loaded_dict = self._load_converted_cache(cache_path, measurements)
+
+        if loaded_dict is None:
+            save_path, bundle = self.converter.process(
+                csv_path=csv_path,
+                output_dir=cache_root,
+                sensor_configs=measurements,
+                processing_config=processing_config,
+                default_sampling_rate=default_sr,
+                default_start_time=start_time_offset,
+                return_data=True
+            )
+            if bundle is not None:
+                # 変換したてのデータはそのまま使う (書いたpklの読み直しを省く)
+                loaded_dict = bundle
+            elif save_path:
+                # キャッシュヒット時のみディスクから読む
+                loaded_dict = self._load_converted_cache(save_path, measurements)
+
+        # SoAバンドル形式なら従来の {name: SensorData} ビューに展開
+        if isinstance(loaded_dict, SensorBundle):
+            loaded_dict = loaded_dict.to_dict()
+
+        if loaded_dict and isinstance(loaded_dict, dict):
+            return loaded_dict
+        return None
+
     def _get_cache_directory(self, source_name):
         base_cache_dir = os.path.join(self.results_root, ".cache")
         if source_name == 'vibration': dir_name = "vibration"
@@ -208,16 +330,58 @@ class DataLoader:
         else: dir_name = source_name
         return os.path.join(base_cache_dir, dir_name)
 
+    def _list_csv_entries(self, search_dir):
+        """
+        ディレクトリ内のCSVを一度だけスキャンし、(path, ファイル名中の数値集合)
+        のリストをディレクトリmtimeで検証しつつキャッシュする。
+        ショットを跨いだバッチ実行時の再スキャンとre.findallの繰り返しを防ぐ。
+        """
+        try:
+            dir_mtime = os.stat(search_dir).st_mtime_ns
+        except OSError:
+            return None
+
+        cached = self._dir_cache.get(search_dir)
+        if cached is not None and cached[0] == dir_mtime:
+            return cached[1]
+
+        entries = []
+        with os.scandir(search_dir) as it:
+            for e in it:
+                if e.name.endswith('.csv'):
+                    nums = {int(n) for n in _num_re.findall(e.name)}
+                    entries.append((e.path, nums))
+        self._dir_cache[search_dir] = (dir_mtime, entries)
+        return entries
+
     def _smart_find_file(self, search_dir, shot_num, hint=None):
-        if not os.path.exists(search_dir): return None
-        files = glob.glob(os.path.join(search_dir, "*.csv"))
-        candidates = [f for f in files if int(shot_num) in [int(n) for n in re.findall(r'\d+', os.path.basename(f))]]
+        entries = self._list_csv_entries(search_dir)
+        if not entries: return None
+        candidates = [path for path, nums in entries if int(shot_num) in nums]
         if not candidates: return None
         if len(candidates) > 1 and hint:
-            filtered = [c for c in candidates if hint.lower() in os.path.basename(c).lower()]
+            hint_lower = hint.lower()
+            filtered = [c for c in candidates if hint_lower in os.path.basename(c).lower()]
             if filtered: return filtered[0]
         return candidates[0]
 
-    def _is_cache_valid(self, source, cache):
-        if not os.path.exists(cache): return False
-        return os.path.getmtime(source) < os.path.getmtime(cache)
\ No newline at end of file
+    def _is_cache_valid(self, source, cache, measurements=None):
+        # 内容署名 (.sigサイドカー) があればそれで判定する。
+        # mtime比較と違い、rsync等でコピーしてもソースが同一なら有効のまま。
+        try:
+            with open(cache + ".sig", 'r') as f:
+                cached_sig = f.read().strip()
+            if measurements is not None:
+                return cached_sig == self.converter._cache_signature(source, measurements)
+            return cached_sig.split(':')[0] == file_signature(source)
+        except OSError:
+            pass
+
+        # 署名のない旧キャッシュはmtime比較にフォールバック
+        # (exists+getmtimeの3回のstatを2回にし、ns整数のまま比較する)
+        try:
+            cache_mtime = os.stat(cache).st_mtime_ns
+            source_mtime = os.stat(source).st_mtime_ns
+        except OSError:
+            return False
+        return source_mtime < cache_mtime
\ No newline at end of file
@@ -1,7 +1,63 @@
 # -*- coding: utf-8 -*-
+import math
 import numpy as np
 from structs import SensorData
 
+try:
+    from numba import njit, prange
+    _HAS_NUMBA = True
+except ImportError:
+    _HAS_NUMBA = False
+
+
+if _HAS_NUMBA:
+    @njit(parallel=True, fastmath=True, cache=True)
+    def _flow_kernel(P_raw, T_raw, p_init, Cd, A_m2, R, gamma, Pb_Pa, cutoff_ratio):
+        """
+        圧縮性流量のJITカーネル。自動ゼロ点補正から単位変換まで
+        1要素1パスで計算するため、NumPy版のような中間配列を確保しない。
+        T_rawは長さ1 (定数温度) またはP_rawと同長の配列。
+        """
+        n = P_raw.shape[0]
+        out = np.empty(n)
+        crit = (2.0 / (gamma + 1.0)) ** (gamma / (gamma - 1.0))
+        term_choked = math.sqrt(
+            gamma * (2.0 / (gamma + 1.0)) ** ((gamma + 1.0) / (gamma - 1.0)))
+        c_unchoked = 2.0 * gamma / (gamma - 1.0)
+        t_scalar = T_raw.shape[0] == 1
+        p_floor = Pb_Pa * 0.999
+        for i in prange(n):
+            P0 = (P_raw[i] - p_init) * 1.0e6 + Pb_Pa
+            if P0 < p_floor:
+                P0 = p_floor
+            T0 = abs(T_raw[0] if t_scalar else T_raw[i]) + 1.0e-9
+            ratio = Pb_Pa / P0
+            if ratio > 1.0:
+                ratio = 1.0
+            base = Cd * A_m2 * P0 / math.sqrt(R * T0)
+            if ratio >= cutoff_ratio:
+                m = 0.0
+            elif ratio > crit:
+                ti = ratio ** (2.0 / gamma) - ratio ** ((gamma + 1.0) / gamma)
+                if ti < 0.0:
+                    ti = 0.0
+                m = base * math.sqrt(c_unchoked * ti)
+            else:
+                m = base * term_choked
+            out[i] = m * 1000.0
+        return out
+
+def _build_flow_const(R, g):
+    """ガス1種分の流量計算定数をまとめる"""
+    return {
+        'R': R,
+        'gamma': g,
+        'crit': (2 / (g + 1)) ** (g / (g - 1)),
+        'term_choked': math.sqrt(g * (2 / (g + 1)) ** ((g + 1) / (g - 1))),
+        'c_unchoked': 2.0 * g / (g - 1.0),
+    }
+
+
 class PhysicsEngine:
     """
     物理量の計算を行うクラス。
@@ -9,6 +65,7 @@ class PhysicsEngine:
     GAS_CONSTANTS = {"Air": 287.058, "H2": 4124.0, "N2": 296.8, "O2": 259.8, "Ar": 208.1}
     GAMMAS = {"Air": 1.4, "H2": 1.405, "N2": 1.4, "O2": 1.395, "Ar": 1.667}
 
+
     def __init__(self):
         pass
 
@@ -60,8 +117,9 @@ class PhysicsEngine:
         A_mm2 = config.get('A_mm2', 1.0)
         cutoff_ratio = config.get('cutoff_ratio', 1.0) # チョーク判定用ではなく、計算打ち切り用の比率
         
-        R = self.GAS_CONSTANTS.get(gas_type, 287.0)
-        gamma = self.GAMMAS.get(gas_type, 1.4)
+        c = self._FLOW_CONST.get(gas_type) or self._FLOW_CONST[None]
+        R = c['R']
+        gamma = c['gamma']
         
         # 背圧の設定 (デフォルトは標準大気圧)
         P_back_MPa = config.get('back_pressure', 0.1013)
@@ -71,73 +129,126 @@ class PhysicsEngine:
         # データの先頭部分(初期値)を「背圧と平衡状態にある圧力」とみなして補正する
         # これにより、センサのオフセット誤差や大気圧変動をキャンセルし、
         # P_raw が初期値に戻ったときに確実に流量が0になるようにする。
-        
+
+        # NumbaがあればJITカーネルで1パス計算 (補正〜単位変換まで中間配列なし)
+        if _HAS_NUMBA and isinstance(P_raw, np.ndarray) and len(P_raw) > 0:
+            n_init = min(100, len(P_raw))
+            # 短いスライスにはnp.meanのディスパッチより直接reduceが安い
+            p_init = float(np.add.reduce(P_raw[:n_init], dtype=np.float64)) / n_init
+            T_arr = np.atleast_1d(np.asarray(T_raw, dtype=np.float64))
+            result_data = _flow_kernel(
+                np.asarray(P_raw, dtype=np.float64), T_arr, p_init,
+                float(Cd), A_mm2 * 1.0e-6, R, gamma, Pb_Pa, float(cutoff_ratio))
+            self._register_result(data_store, target_name, result_data,
+                                  ref_sensor, src_p)
+            return
+
         P0_Pa = None
         
         if isinstance(P_raw, np.ndarray):
             # 初期値の取得 (先頭100点または全データの1%程度)
             n_init = min(100, len(P_raw))
             if n_init > 0:
-                p_initial_mean = np.mean(P_raw[:n_init])
-                
+                p_initial_mean = float(np.add.reduce(P_raw[:n_init], dtype=np.float64)) / n_init
+
                 # 「計測値 - 初期値」で差圧を出し、それに背圧を足して絶対圧とする
                 # P0_abs = (P_measure - P_init) + P_back
                 # これなら P_measure == P_init のとき P0_abs == P_back となり、流量は0になる。
-                P0_Pa = (P_raw - p_initial_mean) * 1.0e6 + Pb_Pa
-                
+                # 最初のsubtractで確保した1本のバッファにout=で書き戻し、
+                # 式の項ごとの一時配列を出さない
+                P0_Pa = np.subtract(P_raw, p_initial_mean, dtype=np.float64)
+                P0_Pa *= 1.0e6
+                P0_Pa += Pb_Pa
+
                 # 念のため負圧防止 (背圧より極端に低い値は背圧にクリップ)
-                P0_Pa = np.maximum(P0_Pa, Pb_Pa * 0.999) 
+                np.maximum(P0_Pa, Pb_Pa * 0.999, out=P0_Pa)
             else:
                 P0_Pa = P_raw * 1.0e6 # データが短すぎる場合はそのまま
         else:
             P0_Pa = float(P_raw) * 1.0e6
 
-        # 温度: K (絶対値)
-        T0_safe = np.abs(T_raw) + 1.0e-9
+        # 温度: K (絶対値)。np.absの戻りはコピーなので以後スクラッチに使える
+        T0_safe = np.abs(T_raw)
+        T0_safe += 1.0e-9
         A_m2 = A_mm2 * 1.0e-6
 
         # --- 計算 (NumPy配列演算) ---
-        # 圧力比 (Pb / P0)
-        # P0が補正されているため、初期状態では Ratio ≒ 1.0 となる
+        # スカラー定数は配列演算の外で先に畳み込む。
+        # 共通係数 base = Cd*A*P0/sqrt(R*T0) を1本だけ確保すると、
+        # 亜音速側は m_dot = base * sqrt(2γ/(γ-1) * term_inner) に整理でき
+        # (T0はルート内で約分される)、choked/unchoked両領域で使い回せる。
+        critical_ratio = c['crit']
+        term_choked = c['term_choked']
+        c_unchoked = c['c_unchoked']
+
+        # 圧力比 (Pb / P0)。P0が補正されているため初期状態では Ratio ≒ 1.0。
+        # 1.0超 (逆流条件) は1.0にクリップして流量0にする
         current_ratio = np.divide(Pb_Pa, P0_Pa)
-        
-        # 1.0を超える(逆流条件)は1.0にクリップして流量0にする
-        current_ratio = np.minimum(current_ratio, 1.0)
-        
-        # 臨界圧力比
-        critical_ratio = (2 / (gamma + 1)) ** (gamma / (gamma - 1))
-
-        # 1. Choked Flow (チョーク流れ)
-        # P0が高いとき (ratio < critical)
-        term_choked = np.sqrt(gamma * (2 / (gamma + 1)) ** ((gamma + 1) / (gamma - 1)))
-        m_dot_choked = (Cd * A_m2 * P0_Pa / np.sqrt(R * T0_safe)) * term_choked
-
-        # 2. Unchoked Flow (亜音速流れ)
-        # P0が低いとき (ratio > critical)
-        term_inner = (current_ratio ** (2/gamma)) - (current_ratio ** ((gamma+1)/gamma))
-        term_inner = np.maximum(term_inner, 0.0) # ルート内負防止
-        m_dot_unchoked = Cd * A_m2 * P0_Pa * np.sqrt(
-            (2*gamma / (R*T0_safe*(gamma-1))) * term_inner
-        )
 
-        # 統合
-        m_dot = m_dot_choked.copy() if isinstance(m_dot_choked, np.ndarray) else np.full_like(P0_Pa, m_dot_choked)
-        
-        # アンチョーク領域の適用
-        mask_unchoked = (current_ratio > critical_ratio)
-        if isinstance(m_dot, np.ndarray):
-            val_unchoked = m_dot_unchoked[mask_unchoked] if isinstance(m_dot_unchoked, np.ndarray) else m_dot_unchoked
-            m_dot[mask_unchoked] = val_unchoked
-            
+        # sqrt(R*T0) はT0_safeバッファ上で直接つくる
+        T0_safe *= R
+        if isinstance(T0_safe, np.ndarray):
+            np.sqrt(T0_safe, out=T0_safe)
+        else:
+            T0_safe = math.sqrt(T0_safe)
+
+        if isinstance(current_ratio, np.ndarray):
+            np.minimum(current_ratio, 1.0, out=current_ratio)
+
+            # 共通係数 base = Cd*A*P0/sqrt(R*T0)。
+            # P0_Paはこれ以降参照しないので係数バッファとして上書きする
+            base = np.divide(P0_Pa, T0_safe, out=P0_Pa)
+            base *= Cd * A_m2
+
+            # 1. Choked Flow (チョーク流れ): ratio < critical
+            m_dot = base * term_choked
+
+            # 2. Unchoked Flow (亜音速流れ): 該当要素だけ抜き出して上書き
+            mask_unchoked = (current_ratio > critical_ratio)
+            if np.any(mask_unchoked):
+                r = current_ratio[mask_unchoked]
+                # r**a - r**b は log/exp恒等式で
+                #   exp(a*lr) * (1 - exp((b-a)*lr)),  lr = log(r)
+                # に書ける。pow 2回がlog 1回+exp 2回になり、expの方が
+                # pow (内部でlog+exp) より速いぶん得。rはクリップ済みで
+                # (0, 1] に収まるためlogは常に有限。
+                a = 2.0 / gamma
+                b = (gamma + 1.0) / gamma
+                lr = np.log(r)
+                term_inner = np.exp((b - a) * lr)
+                np.subtract(1.0, term_inner, out=term_inner)
+                lr *= a
+                np.exp(lr, out=lr)
+                term_inner *= lr
+                np.maximum(term_inner, 0.0, out=term_inner)  # ルート内負防止
+                term_inner *= c_unchoked
+                np.sqrt(term_inner, out=term_inner)
+                m_dot[mask_unchoked] = base[mask_unchoked] * term_inner
+
             # カットオフ (比率が1.0に極めて近い、つまり差圧がない場合は強制0)
             # cutoff_ratio (例: 0.99) 以上なら0にする
-            mask_cutoff = (current_ratio >= cutoff_ratio)
-            m_dot[mask_cutoff] = 0.0
+            m_dot[current_ratio >= cutoff_ratio] = 0.0
+        else:
+            # 定数圧力指定の場合 (0次元のまま従来互換で返す)
+            base = Cd * A_m2 * P0_Pa / T0_safe
+            current_ratio = min(current_ratio, 1.0)
+            if current_ratio > critical_ratio:
+                term_inner = max(current_ratio ** (2 / gamma)
+                                 - current_ratio ** ((gamma + 1) / gamma), 0.0)
+                m_dot = base * np.sqrt(c_unchoked * term_inner)
+            else:
+                m_dot = base * term_choked
+            if not isinstance(m_dot, np.ndarray):
+                # 温度も定数なら0次元配列で返す (従来互換)
+                m_dot = np.full_like(P0_Pa, m_dot)
 
         # 単位変換 kg/s -> g/s
         result_data = m_dot * 1000.0
 
-        # 結果をSensorDataとして登録
+        self._register_result(data_store, target_name, result_data, ref_sensor, src_p)
+
+    def _register_result(self, data_store, target_name, result_data, ref_sensor, src_p):
+        """計算結果をSensorDataとして登録する"""
         fs_new = ref_sensor.fs if ref_sensor else 1.0
         t0_new = ref_sensor.start_time if ref_sensor else 0.0
 
@@ -149,6 +260,14 @@ class PhysicsEngine:
             start_time=t0_new,
             source=f"Derived(from {src_p})"
         )
-        
+
         data_store[target_name] = new_sensor
-        print(f"    🔍 計算完了: {target_name} (Mean: {np.mean(result_data):.2f} g/s, Auto-Zero: ON)")
\ No newline at end of file
+        print(f"    🔍 計算完了: {target_name} (Mean: {np.mean(result_data):.2f} g/s, Auto-Zero: ON)")
+
+# ガス種ごとの流量計算定数 (インポート時に一度だけ評価するLUT)。
+# Noneキーは未知ガスのフォールバック (従来どおり R=287, gamma=1.4)。
+PhysicsEngine._FLOW_CONST = {
+    gas: _build_flow_const(PhysicsEngine.GAS_CONSTANTS[gas], g)
+    for gas, g in PhysicsEngine.GAMMAS.items()
+}
+PhysicsEngine._FLOW_CONST[None] = _build_flow_const(287.0, 1.4)
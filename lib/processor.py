@@ -1,9 +1,28 @@
 # -*- coding: utf-8 -*-
+import os
+import functools
+import threading
 import pandas as pd
 import numpy as np
 from scipy import signal
+from scipy.ndimage import uniform_filter1d
+from concurrent.futures import ThreadPoolExecutor
 from structs import SensorData
-import copy
+import _kernels
+
+
+@functools.lru_cache(maxsize=32)
+def _savgol_coeffs(window_length, polyorder):
+    """S-G係数 (最小二乗解) は(窓, 次数)ごとに1回だけ計算する"""
+    return signal.savgol_coeffs(window_length, polyorder)
+
+
+@functools.lru_cache(maxsize=64)
+def _design_sos(order, cutoff_freq, fs):
+    """Butterworth SOS設計をショット・呼び出しを跨いでキャッシュする"""
+    return signal.butter(order, cutoff_freq / (0.5 * fs),
+                         btype='low', output='sos')
+
 
 class DataProcessor:
     """
@@ -11,7 +30,23 @@ class DataProcessor:
     Dict[str, SensorData] に対して処理を行う。
     """
     def __init__(self):
-        pass
+        # 一時バッファのプール {(shape, dtype): ndarray}。
+        # 出力配列はsensor.dataとして生き続けるため使い回せないが、
+        # パディングやスタッキングのスクラッチは同形状の信号が続く
+        # バッチ実行でmalloc/freeを繰り返す必要がない。
+        # channel-major実行はスレッド並列なのでプールはスレッドローカル。
+        self._bufpool = threading.local()
+
+    def _buf(self, shape, dtype=np.float64):
+        """プールから一時バッファを取り出す (中身は未初期化)"""
+        pool = getattr(self._bufpool, 'bufs', None)
+        if pool is None:
+            pool = self._bufpool.bufs = {}
+        key = (shape, np.dtype(dtype))
+        b = pool.get(key)
+        if b is None:
+            b = pool[key] = np.empty(shape, dtype)
+        return b
 
     def apply_preprocessing(self, data_store, processing_list):
         """
@@ -33,48 +68,136 @@ class DataProcessor:
             else:
                 valid_targets = targets
 
-            if method == 'moving_average':
-                window = proc.get('window', 10)
-                center = proc.get('center', True)
-                self._apply_moving_average(data_store, valid_targets, window, center)
-
-            elif method == 'moving_median':
-                # ★追加: 移動中央値フィルタ
-                window = proc.get('window', 11)
-                center = proc.get('center', True)
-                self._apply_moving_median(data_store, valid_targets, window, center)
-
-            elif method == 'lowpass_filter':
-                cutoff = proc.get('cutoff_freq', 10.0)
-                order = proc.get('order', 2)
-                self._apply_lowpass_filter(data_store, valid_targets, cutoff, order)
-
-            elif method == 'offset_correction':
-                time_range = proc.get('range', [-1.0, 0.0])
-                target_val = proc.get('target_value', 0.0)
-                self._apply_offset_correction(data_store, valid_targets, time_range, target_val)
-
-            elif method == 'polynomial_fit':
-                degree = proc.get('degree', 5)
-                self._apply_polynomial_fit(data_store, valid_targets, degree)
+            self._dispatch(data_store, proc, valid_targets)
             
-            elif method == 'copy_channel':
+        return data_store
+
+    def apply_pipeline_fused(self, data_store, processing_list):
+        """
+        処理リストをチャンネル主導 (channel-major) で実行する。
+        ステージ主導では処理のたびに全チャンネルを一巡し、大きな配列が
+        毎回キャッシュから追い出される。各処理はチャンネル間で独立なので、
+        1チャンネル分の処理チェーンを定義順のまま連続して流しても結果は
+        変わらず、配列がキャッシュに載ったまま次の処理に渡せる。
+        """
+        if not processing_list: return data_store
+
+        print("  [Processor] 前処理パイプラインを実行中 (channel-major)...")
+
+        # チャンネルごとの処理チェーン (チェーン内は定義順を維持)
+        chains = {}
+        for proc in processing_list:
+            for t in proc.get('targets', []):
+                chains.setdefault(t, []).append(proc)
+
+        def _run_chain(name):
+            for proc in chains[name]:
+                if proc.get('method') != 'copy_channel' and name not in data_store:
+                    continue
+                self._dispatch(data_store, proc, [name])
+
+        # copy_channelで生成されるチャンネルのチェーンは、複製元チェーンが
+        # copyを実行するまで対象がdata_storeに存在せず、並列で先に走ると
+        # 処理が黙ってスキップされる。生成関係 (元 -> 元+suffix) を辿った
+        # 深さでチェーンをレベル分けし、レベル順に実行する。
+        produced_by = {}
+        for proc in processing_list:
+            if proc.get('method') == 'copy_channel':
                 suffix = proc.get('suffix', '_Raw')
-                self._apply_copy_channel(data_store, valid_targets, suffix)
+                for t in proc.get('targets', []):
+                    produced_by.setdefault(f"{t}{suffix}", t)
+
+        def _level(name):
+            lv = 0
+            seen = set()
+            while name in produced_by and name not in seen:
+                seen.add(name)
+                name = produced_by[name]
+                lv += 1
+            return lv
+
+        levels = {}
+        for name in chains:
+            levels.setdefault(_level(name), []).append(name)
+
+        # レベル内のチェーンはチャンネル間で独立。NumPy/SciPyのCカーネルは
+        # GILを手放すため、スレッドプールに載せるだけで多チャンネルショットは
+        # コア数近くまでスケールする (dictへのキー追加はGIL保護で安全)
+        for lv in sorted(levels):
+            group = levels[lv]
+            if len(group) > 1:
+                workers = min(os.cpu_count() or 1, len(group))
+                with ThreadPoolExecutor(max_workers=workers) as ex:
+                    list(ex.map(_run_chain, group))
+            else:
+                _run_chain(group[0])
 
-            elif method == 'savgol_filter':
-                window_length = proc.get('window_length', 51)
-                polyorder = proc.get('polyorder', 3)
-                self._apply_savgol_filter(data_store, valid_targets, window_length, polyorder)
-            
         return data_store
 
+    def _dispatch(self, data_store, proc, targets):
+        """処理1件を対象チャンネル群に適用する"""
+        method = proc.get('method')
+
+        if method == 'moving_average':
+            window = proc.get('window', 10)
+            center = proc.get('center', True)
+            self._apply_moving_average(data_store, targets, window, center)
+
+        elif method == 'moving_median':
+            # ★追加: 移動中央値フィルタ
+            window = proc.get('window', 11)
+            center = proc.get('center', True)
+            self._apply_moving_median(data_store, targets, window, center)
+
+        elif method == 'lowpass_filter':
+            cutoff = proc.get('cutoff_freq', 10.0)
+            order = proc.get('order', 2)
+            self._apply_lowpass_filter(data_store, targets, cutoff, order)
+
+        elif method == 'offset_correction':
+            time_range = proc.get('range', [-1.0, 0.0])
+            target_val = proc.get('target_value', 0.0)
+            self._apply_offset_correction(data_store, targets, time_range, target_val)
+
+        elif method == 'polynomial_fit':
+            degree = proc.get('degree', 5)
+            self._apply_polynomial_fit(data_store, targets, degree)
+
+        elif method == 'copy_channel':
+            suffix = proc.get('suffix', '_Raw')
+            self._apply_copy_channel(data_store, targets, suffix)
+
+        elif method == 'savgol_filter':
+            window_length = proc.get('window_length', 51)
+            polyorder = proc.get('polyorder', 3)
+            self._apply_savgol_filter(data_store, targets, window_length, polyorder)
+
     def _apply_moving_average(self, data_store, targets, window, center):
+        # pandasのrollingはチャンクごとのPythonディスパッチが重いので、
+        # scipyのC実装 (O(N)の漸化式) に置き換える。端は範囲外を0として
+        # 窓和を取り実要素数で割ることで rolling(min_periods=1) と一致させる。
+        origin = 0 if center else (window - 1) // 2
+
+        # 同一長のチャンネルは (nchan, N) の1枚の行列に積んで
+        # uniform_filter1d(axis=1) で一括処理する (SoA化)。
+        # チャンネルごとにC関数を呼ぶよりディスパッチ回数が減り、
+        # 連続バッファ上の1スイープになるためプリフェッチも効く。
+        groups = {}
         for name in targets:
-            sensor = data_store[name]
-            raw_data = sensor.data
-            smoothed = pd.Series(raw_data).rolling(window=window, center=center, min_periods=1).mean().values
-            sensor.data = smoothed
+            groups.setdefault(len(data_store[name].data), []).append(name)
+
+        for n, names in groups.items():
+            mat = np.empty((len(names), n), dtype=np.float64)
+            for i, name in enumerate(names):
+                mat[i, :] = data_store[name].data
+            sums = uniform_filter1d(mat, size=window, axis=1, mode='constant',
+                                    cval=0.0, origin=origin) * window
+            # 端の実要素数は全チャンネル共通なので1行分だけ計算する
+            counts = uniform_filter1d(np.ones(n), size=window,
+                                      mode='constant', cval=0.0, origin=origin) * window
+            sums /= np.round(counts)
+            for i, name in enumerate(names):
+                data_store[name].data = sums[i]
         c_str = "Center" if center else "Backward"
         print(f"    🔄 移動平均: win={window} ({c_str}), targets={targets}")
 
@@ -85,77 +208,172 @@ class DataProcessor:
         for name in targets:
             sensor = data_store[name]
             raw_data = sensor.data
-            # Pandasのrolling().median()を使用
-            smoothed = pd.Series(raw_data).rolling(window=window, center=center, min_periods=1).median().values
+            if _kernels._HAS_NUMBA:
+                # JITのスライディング中央値 (ソート済みバッファ維持)。
+                # pandasのrollingはチャンクごとのディスパッチが支配的になる
+                smoothed = _kernels.rolling_median(
+                    np.asarray(raw_data, dtype=np.float64), window, center)
+            else:
+                smoothed = pd.Series(raw_data).rolling(window=window, center=center, min_periods=1).median().values
             sensor.data = smoothed
         c_str = "Center" if center else "Backward"
         print(f"    🧱 移動中央値: win={window} ({c_str}), targets={targets}")
 
     def _apply_lowpass_filter(self, data_store, targets, cutoff_freq, order):
+        # fsごとにまとめてSOSを1回だけ設計する。TF形式(b,a)のfiltfiltは
+        # 高次で数値的に劣化するためSOS+sosfiltfiltに変更。同一長の
+        # チャンネルは2Dに積み、Cythonの_sosfiltを1スイープで回す。
+        buckets = {}
         for name in targets:
-            sensor = data_store[name]
-            data = sensor.data
-            fs = sensor.fs
+            buckets.setdefault(data_store[name].fs, []).append(name)
+
+        for fs, names in buckets.items():
             nyq = 0.5 * fs
             normal_cutoff = cutoff_freq / nyq
             if normal_cutoff >= 1.0:
-                print(f"    ⚠️ LPFスキップ: カットオフ周波数がナイキスト周波数を超えています ({name})")
+                print(f"    ⚠️ LPFスキップ: カットオフ周波数がナイキスト周波数を超えています ({names})")
                 continue
-            b, a = signal.butter(order, normal_cutoff, btype='low', analog=False)
-            if len(data) > 3 * max(len(a), len(b)):
+            sos = _design_sos(order, cutoff_freq, fs)
+            default_padlen = 3 * 2 * sos.shape[0]
+
+            groups = {}
+            for name in names:
+                n = len(data_store[name].data)
+                if n < 6:
+                    # padlenを縮めても意味のある往復フィルタにならない長さ
+                    print(f"    ⚠️ LPFスキップ: データ点数が不足しています ({name})")
+                    continue
+                groups.setdefault(n, []).append(name)
+
+            for n, group in groups.items():
+                # 短い信号はpadlenを信号長に合わせて縮め、scipy側の
+                # 長さチェックに任せる (TF形式の手前チェックは不要になった)
+                padlen = min(default_padlen, n - 1)
                 try:
-                    y = signal.filtfilt(b, a, data)
-                    sensor.data = y
+                    if len(group) > 1:
+                        X = self._buf((len(group), n))
+                        for i, name in enumerate(group):
+                            X[i, :] = data_store[name].data
+                        Y = signal.sosfiltfilt(sos, X, axis=-1, padlen=padlen)
+                        for i, name in enumerate(group):
+                            data_store[name].data = Y[i]
+                    else:
+                        name = group[0]
+                        data_store[name].data = signal.sosfiltfilt(
+                            sos, data_store[name].data, padlen=padlen)
                 except Exception as e:
-                    print(f"    ⚠️ LPFエラー ({name}): {e}")
-            else:
-                print(f"    ⚠️ LPFスキップ: データ点数が不足しています ({name})")
+                    print(f"    ⚠️ LPFエラー ({group}): {e}")
         print(f"    📉 LPF適用: fc={cutoff_freq}Hz, order={order}, targets={targets}")
 
     def _apply_offset_correction(self, data_store, targets, time_range, target_val):
-        print(f"    ⚖️ オフセット補正 (基準範囲: {time_range} s, Target: {target_val})")
+        # ログはまとめて1回のprintで出す (ターゲットごとのflushを避ける)
+        lines = [f"    ⚖️ オフセット補正 (基準範囲: {time_range} s, Target: {target_val})"]
         for name in targets:
             sensor = data_store[name]
-            t = sensor.time
             data = sensor.data
-            mask = (t >= time_range[0]) & (t <= time_range[1])
-            if np.any(mask):
-                current_mean = np.mean(data[mask])
+            if sensor.fs > 0:
+                # 時間軸は等間隔 (index/fs + start_time) なので、ブール
+                # マスクを作らずO(1)のインデックス計算で範囲を切り出す。
+                # 全長のマスク2本 (生成+適用) ぶんのメモリ走査が消える。
+                fs = sensor.fs
+                st = sensor.start_time
+                i0 = max(0, int(np.ceil((time_range[0] - st) * fs - 1e-9)))
+                i1 = min(len(data), int(np.floor((time_range[1] - st) * fs + 1e-9)) + 1)
+            else:
+                i0 = i1 = 0
+            if i1 > i0:
+                current_mean = float(np.mean(data[i0:i1]))
                 correction = target_val - current_mean
                 sensor.data = data + correction
-                print(f"      -> {name}: {current_mean:.4f} -> {target_val:.4f} (Correction: {correction:+.4f})")
+                lines.append(f"      -> {name}: {current_mean:.4f} -> {target_val:.4f} (Correction: {correction:+.4f})")
             else:
-                print(f"      ⚠️ {name}: 指定範囲にデータがないため補正スキップ")
+                lines.append(f"      ⚠️ {name}: 指定範囲にデータがないため補正スキップ")
+        print("\n".join(lines))
 
     def _apply_polynomial_fit(self, data_store, targets, degree):
         print(f"    📐 多項式近似 (Degree: {degree}, targets={targets})")
+        # 同じ時間軸 (点数・fs・開始時刻が同一) のチャンネルはVandermonde
+        # 行列を共有できるので、まとめて1回のlstsqで解く
+        # (K本の独立なQR分解がBLASの1回の複数右辺解に置き換わる)。
+        # 評価もpoly1dではなく V @ C の行列積1回で済ませる。
+        groups = {}
         for name in targets:
-            sensor = data_store[name]
-            t = sensor.time
-            y = sensor.data
-            coeffs = np.polyfit(t, y, degree)
-            poly_func = np.poly1d(coeffs)
-            sensor.data = poly_func(t)
+            s = data_store[name]
+            key = (len(s.data), s.fs, s.start_time)
+            groups.setdefault(key, []).append(name)
+
+        for names in groups.values():
+            t = data_store[names[0]].time
+            # polyfit同様、条件数改善のため列ごとにノルムでスケールする
+            V = np.vander(t, degree + 1)
+            norms = np.sqrt(np.square(V).sum(axis=0))
+            V /= norms
+            Y = np.stack([data_store[n].data for n in names], axis=1)
+            coeffs, _, _, _ = np.linalg.lstsq(V, Y, rcond=None)
+            Yhat = V @ coeffs
+            for i, name in enumerate(names):
+                data_store[name].data = Yhat[:, i]
 
     def _apply_copy_channel(self, data_store, targets, suffix):
-        print(f"    ©️ チャンネル複製 (Suffix: '{suffix}')")
+        lines = [f"    ©️ チャンネル複製 (Suffix: '{suffix}')"]
         for name in targets:
             if name not in data_store: continue
             original = data_store[name]
             new_name = f"{name}{suffix}"
-            new_sensor = copy.deepcopy(original)
-            new_sensor.name = new_name
-            new_sensor.source = f"Copied from {name}"
+            # deepcopyはndarrayをpickleプロトコル経由で複製するので、
+            # フィールドを明示して data.copy() のmemcpy 1回で済ませる
+            new_sensor = SensorData(
+                name=new_name,
+                data=original.data.copy(),
+                fs=original.fs,
+                unit=original.unit,
+                start_time=original.start_time,
+                source=f"Copied from {name}",
+            )
             data_store[new_name] = new_sensor
-            print(f"      -> {name} copied to {new_name}")
+            lines.append(f"      -> {name} copied to {new_name}")
+        print("\n".join(lines))
 
     def _apply_savgol_filter(self, data_store, targets, window_length, polyorder):
         print(f"    ✨ Savitzky-Golayフィルタ (Window: {window_length}, PolyOrder: {polyorder}, targets={targets})")
+        if window_length % 2 == 0:
+            window_length += 1
+        half = window_length // 2
+
+        # 同一長のチャンネルは2Dに積み、畳み込みを1回で済ませる (SoA化)
+        groups = {}
+        short = []
         for name in targets:
+            n = len(data_store[name].data)
+            if n > 4 * window_length:
+                groups.setdefault(n, []).append(name)
+            else:
+                short.append(name)
+
+        for n, group in groups.items():
+            try:
+                # 係数はFIRなので(window, order)ごとに1回求めればよく、
+                # 適用はFFTオーバーラップ加算の畳み込み1回で済む
+                # (直接畳み込みO(N·w)に対しO(N log w))。端はedgeパディング。
+                coeffs = _savgol_coeffs(window_length, polyorder)
+                # edgeパディングはプールの一時バッファ上で行う
+                padded = self._buf((len(group), n + 2 * half))
+                for i, name in enumerate(group):
+                    y = data_store[name].data
+                    padded[i, :half] = y[0]
+                    padded[i, half:half + n] = y
+                    padded[i, half + n:] = y[-1]
+                out = signal.oaconvolve(padded, coeffs[np.newaxis, :],
+                                        mode='valid', axes=-1)
+                for i, name in enumerate(group):
+                    data_store[name].data = out[i]
+            except Exception as e:
+                print(f"    ⚠️ S-G Filterエラー ({group}): {e}")
+
+        for name in short:
             sensor = data_store[name]
-            if window_length % 2 == 0:
-                window_length += 1
             try:
+                # 短い信号は従来どおり (端の多項式補間込み)
                 sensor.data = signal.savgol_filter(sensor.data, window_length, polyorder)
             except Exception as e:
                 print(f"    ⚠️ S-G Filterエラー ({name}): {e}")
\ No newline at end of file
@@ -6,6 +6,10 @@ import cv2
 import numpy as np
 import matplotlib.pyplot as plt
 import matplotlib.patches as patches
+from ast import literal_eval
+from matplotlib.collections import PatchCollection
+
+_num_re = re.compile(r'\d+')
 
 class ROIVisualizer:
     """
@@ -43,8 +47,21 @@ class ROIVisualizer:
         # 4. 画像読み込み (日本語パス対応版 & Matplotlib用RGB変換)
         try:
             img_array = np.fromfile(target_img_path, dtype=np.uint8)
-            img = cv2.imdecode(img_array, cv2.IMREAD_UNCHANGED)
-            
+
+            # 確認画像は幅10in×150dpi≒1500pxで保存されるので、それを
+            # 大きく超える元画像はlibjpegのDCTドメイン縮小デコード
+            # (IMREAD_REDUCED_*) で読む。IDCTする画素数が1/4〜1/16に減る。
+            native = self._jpeg_size(img_array)
+            target_px = 10 * 150
+            flag, scale = cv2.IMREAD_UNCHANGED, 1
+            if native is not None:
+                if native[0] >= 4 * target_px:
+                    flag, scale = cv2.IMREAD_REDUCED_COLOR_4, 4
+                elif native[0] >= 2 * target_px:
+                    flag, scale = cv2.IMREAD_REDUCED_COLOR_2, 2
+
+            img = cv2.imdecode(img_array, flag)
+
             if img is None:
                 print(f"❌ [ROI] 画像の読み込みに失敗しました。")
                 return
@@ -62,7 +79,14 @@ class ROIVisualizer:
             else:
                 img_rgb = img.copy()
 
-            print(f"    ℹ️  Image Info: {img.shape[1]}x{img.shape[0]} px")
+            # ROI座標・軸表示は常に元解像度基準 (縮小デコード時はextentで合わせる)
+            if scale > 1:
+                native_w, native_h = native
+            else:
+                native_w, native_h = img.shape[1], img.shape[0]
+
+            print(f"    ℹ️  Image Info: {native_w}x{native_h} px"
+                  + (f" (1/{scale}デコード)" if scale > 1 else ""))
 
         except Exception as e:
             print(f"❌ [ROI] 画像デコードエラー: {e}")
@@ -92,47 +116,47 @@ class ROIVisualizer:
         # 6. Matplotlibによる描画処理
         try:
             # 図の作成 (サイズは画像のアスペクト比に合わせるが、最大幅を制限)
-            h, w = img_rgb.shape[:2]
+            h, w = native_h, native_w
             fig_width = 10
             fig_height = fig_width * (h / w)
-            
+
             fig, ax = plt.subplots(figsize=(fig_width, fig_height))
+
+            # 画像を表示 (縮小デコードでも座標軸とROIは元解像度のピクセル値)
+            ax.imshow(img_rgb, extent=(-0.5, w - 0.5, h - 0.5, -0.5))
             
-            # 画像を表示
-            ax.imshow(img_rgb)
-            
-            count = 0
             print(f"ℹ️  [ROI] 検出されたHSC設定数: {len(hsc_items)}")
-            
+
+            # 矩形は集めておいて最後にPatchCollectionで一括描画する
+            # (add_patchをROIごとに呼ぶとバックエンド呼び出しがK回になる)
+            rects = []
             for item in hsc_items:
                 name = item.get('name', 'Unknown')
                 roi = item.get('roi', None) # [x, y, w, h]
-                
+
                 if roi:
                     try:
-                        if isinstance(roi, str): roi = eval(roi)
-                        
+                        if isinstance(roi, str):
+                            # evalはフルコンパイル+任意コード実行なのでliteral_evalに
+                            roi = literal_eval(roi)
+
                         if len(roi) == 4:
                             x, y, rect_w, rect_h = map(int, roi)
-                            
+
                             # 範囲チェックログ
                             if x >= w or y >= h:
                                 print(f"    ⚠️ Warning: ROI ({x},{y}) が画像サイズ ({w}x{h}) の外にあります！")
-                            
+
                             print(f"    ✏️  Drawing: {name} -> Rect({x}, {y}, {rect_w}, {rect_h})")
 
                             # --- 赤枠 (Rectangle Patch) ---
                             # xyは左下ではなく「左上」が基準 (Matplotlibの画像座標系はy軸が下向き)
-                            rect = patches.Rectangle((x, y), rect_w, rect_h, 
-                                                     linewidth=2, edgecolor='red', facecolor='none')
-                            ax.add_patch(rect)
-                            
+                            rects.append(patches.Rectangle((x, y), rect_w, rect_h))
+
                             # --- テキストラベル ---
                             # 枠の左上に表示。視認性を上げるため背景色をつける
                             ax.text(x, y - 5, name, color='yellow', fontsize=10, fontweight='bold',
                                     bbox=dict(facecolor='black', alpha=0.5, edgecolor='none', pad=1))
-                            
-                            count += 1
                         else:
                             print(f"⚠️ [ROI] '{name}' のROI要素数が不正です: {roi}")
                     except Exception as e:
@@ -140,6 +164,11 @@ class ROIVisualizer:
                 else:
                     print(f"⚠️ [ROI] '{name}' のROI設定が空(None)です。")
 
+            count = len(rects)
+            if rects:
+                ax.add_collection(PatchCollection(
+                    rects, linewidth=2, edgecolor='red', facecolor='none'))
+
             # 7. 軸・グリッドの設定
             ax.set_title(f"Shot {shot_number} ROI Check", fontsize=14)
             ax.set_xlabel("X [pixel]")
@@ -155,8 +184,10 @@ class ROIVisualizer:
             save_name = f"Shot{shot_number:02d}_ROI_Check_Grid.png"
             save_path = os.path.join(output_dir, save_name)
             
-            # 余白を調整して保存
-            plt.tight_layout()
+            # 余白は固定値で調整する (tight_layoutはレンダラを1回余計に
+            # 回してテキスト寸法を測るため、バッチ保存では半分近くが
+            # レイアウト計算になる)
+            fig.subplots_adjust(left=0.1, right=0.97, bottom=0.08, top=0.94)
             plt.savefig(save_path, dpi=150)
             plt.close(fig) # メモリ解放
             
@@ -170,13 +201,42 @@ class ROIVisualizer:
             import traceback
             traceback.print_exc()
 
+    @staticmethod
+    def _jpeg_size(buf):
+        """JPEGのSOFマーカーから (幅, 高さ) をデコードなしで読む"""
+        try:
+            if len(buf) < 4 or buf[0] != 0xFF or buf[1] != 0xD8:
+                return None
+            i = 2
+            n = len(buf)
+            while i + 9 < n:
+                if buf[i] != 0xFF:
+                    return None
+                marker = int(buf[i + 1])
+                # スタンドアロンマーカー (長さフィールドなし)
+                if marker in (0xD8, 0x01) or 0xD0 <= marker <= 0xD7:
+                    i += 2
+                    continue
+                # SOF0〜SOF15 (DHT/JPG/DACを除く) がフレームサイズを持つ
+                if 0xC0 <= marker <= 0xCF and marker not in (0xC4, 0xC8, 0xCC):
+                    h = (int(buf[i + 5]) << 8) | int(buf[i + 6])
+                    w = (int(buf[i + 7]) << 8) | int(buf[i + 8])
+                    return (w, h)
+                i += 2 + ((int(buf[i + 2]) << 8) | int(buf[i + 3]))
+        except (IndexError, ValueError):
+            pass
+        return None
+
     def _find_shot_folder(self, search_root, shot_num):
         """Shot番号を含むフォルダを検索"""
         if not os.path.exists(search_root): return None
-        subdirs = [d for d in os.listdir(search_root) if os.path.isdir(os.path.join(search_root, d))]
-        
-        candidates = [d for d in subdirs if str(shot_num) in re.findall(r'\d+', d)]
-        
+        # os.scandirはis_dir()のstat結果をキャッシュするのでlistdir+isdirより速い
+        shot_str = str(shot_num)
+        with os.scandir(search_root) as it:
+            candidates = [e.name for e in it
+                          if e.is_dir() and shot_str in _num_re.findall(e.name)]
+
         if not candidates: return None
-        candidates.sort(key=len)
+        if len(candidates) > 1:
+            candidates.sort(key=len)
         return os.path.join(search_root, candidates[0])
\ No newline at end of file
@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+"""
+HSC輝度解析のホットループ用カーネル。
+
+NumbaがあればGILを解放するJITカーネルで全ROIを並列合計し、
+なければ積分画像 (cv2.integral) ベースのNumPy実装にフォールバックする。
+"""
+import cv2
+import numpy as np
+
+try:
+    from numba import njit
+    HAS_NUMBA = True
+except ImportError:
+    HAS_NUMBA = False
+
+if HAS_NUMBA:
+    # 並列化は呼び出し側のスレッドプールに任せる。
+    # (parallel=True はワーカースレッドからの呼び出しと相性が悪い)
+    @njit(nogil=True, cache=True)
+    def _roi_means_njit(img, rois, out):
+        """
+        img:  (H, W) uint8
+        rois: (N, 4) int64 [x_s, y_s, x_e, y_e] (クリップ済み)
+        out:  (N,) float32
+        """
+        for i in range(rois.shape[0]):
+            x_s, y_s = rois[i, 0], rois[i, 1]
+            x_e, y_e = rois[i, 2], rois[i, 3]
+            area = (x_e - x_s) * (y_e - y_s)
+            if area <= 0:
+                out[i] = 0.0
+            else:
+                total = 0
+                for y in range(y_s, y_e):
+                    for x in range(x_s, x_e):
+                        total += img[y, x]
+                out[i] = total / area
+
+
+def compute_means(img, rois_np, out):
+    """
+    クリップ済みROI表の各領域の平均輝度を out に書き込む。
+    面積0のROIは 0.0 (旧実装互換)。
+    """
+    if HAS_NUMBA:
+        _roi_means_njit(img, rois_np, out)
+        return
+
+    # フォールバック: 積分画像1回 + ROIごとに4点参照
+    S = cv2.integral(img, sdepth=cv2.CV_32S)
+    x_s, y_s, x_e, y_e = rois_np.T
+    sums = (S[y_e, x_e] - S[y_s, x_e] - S[y_e, x_s] + S[y_s, x_s])
+    areas = (x_e - x_s) * (y_e - y_s)
+    out[:] = 0.0
+    np.divide(sums, areas, out=out, where=(areas > 0))
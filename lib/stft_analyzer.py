@@ -1,8 +1,34 @@
 # -*- coding: utf-8 -*-
 import os
+import functools
 import numpy as np
 import scipy.signal as signal
 import pickle
+import cache_io
+from concurrent.futures import ThreadPoolExecutor
+
+# h5pyがあればキーごとのデータセットとして保存でき、
+# ローダはpeak系列だけを部分読み出しできる (Zxx/Ampを読み飛ばせる)
+try:
+    import h5py
+    _HAS_H5PY = True
+except ImportError:
+    _HAS_H5PY = False
+
+@functools.lru_cache(maxsize=16)
+def _get_sfft(window_type, nperseg, noverlap, fs):
+    """
+    ShortTimeFFT (scipy>=1.12) を (窓, nperseg, noverlap, fs) ごとに
+    キャッシュする。窓生成とFFTプランがターゲット・ショットを跨いで
+    再利用される。旧scipyではNoneを返し、従来のsignal.stftを使う。
+    """
+    if not hasattr(signal, 'ShortTimeFFT'):
+        return None
+    win = signal.get_window(window_type, nperseg)
+    return signal.ShortTimeFFT(win, hop=nperseg - noverlap, fs=fs,
+                               fft_mode='onesided', scale_to='magnitude',
+                               phase_shift=None)
+
 
 class STFTAnalyzer:
     """
@@ -27,6 +53,10 @@ class STFTAnalyzer:
         window_type = settings.get('window', 'hann')
         nperseg = settings.get('nperseg', 512)
         noverlap = settings.get('noverlap', 256)
+        # 既定float32: 入力をfloat32に落とすとZxxがcomplex64で出てきて、
+        # メモリ帯域・pickleサイズとも半減する。pocketfftはFP32カーネルを
+        # 持つためSTFT自体も速い。必要なら 'float64' で従来精度に戻せる。
+        precision = np.dtype(settings.get('precision', 'float32'))
         
         save_dir = os.path.join(output_root_dir, ".cache", "stft")
         os.makedirs(save_dir, exist_ok=True)
@@ -34,36 +64,62 @@ class STFTAnalyzer:
 
         print(f"\n🌊 [STFT] 解析開始 (Win:{nperseg}, Overlap:{noverlap})")
 
+        valid_targets = []
         for name in targets:
             if name not in data_store:
                 print(f"⚠️ [STFT] データなし: {name}")
                 continue
+            valid_targets.append(name)
 
+        def _do_one(name):
             sensor = data_store[name]
-            sig = sensor.data
+            sig = np.ascontiguousarray(sensor.data, dtype=precision)
             fs = sensor.fs
-            
-            # STFT計算
-            f, t, Zxx = signal.stft(
-                sig, fs=fs, window=window_type, 
-                nperseg=nperseg, noverlap=noverlap, detrend='constant'
-            )
-            
+
+            # DC除去はセグメントごと (detrend='constant', O(T·nperseg)) では
+            # なく全体平均1回で行う。スペクトルの定常成分除去という目的は
+            # 同じで、セグメント間の基準も揃う。
+            # (sigが元データと同一バッファの場合があるので在地引き算はしない)
+            sig = sig - precision.type(sig.mean(dtype=np.float64))
+
+            # STFT計算。float64精度のときはキャッシュ済みShortTimeFFTで
+            # 窓・FFTプランを使い回す (出力はsignal.stftと1e-9で一致)。
+            # float32ではShortTimeFFTがcomplex128を返しcomplex64の
+            # 帯域半減が消えるため、従来のsignal.stftを使う。
+            sfft = _get_sfft(window_type, nperseg, noverlap, fs) \
+                if precision.itemsize == 8 else None
+            if sfft is not None:
+                Zxx = sfft.stft(sig, padding='zeros')
+                f = sfft.f
+                t = sfft.t(len(sig))
+            else:
+                f, t, Zxx = signal.stft(
+                    sig, fs=fs, window=window_type,
+                    nperseg=nperseg, noverlap=noverlap, detrend=False
+                )
+
             t_abs = t + sensor.start_time
-            amp = np.abs(Zxx)
 
             # --- ★追加: ピーク周波数と強度の抽出 ---
+            # パワー2乗 (re²+im²) で処理すると、複素absのhypotを
+            # F·T要素分スキップできる。argmaxは単調変換に不変なので
+            # 2乗のままでよく、dB化も 10*log10(p2) で等価。
+            p2 = np.square(Zxx.real) + np.square(Zxx.imag)
+
             # 各時間ステップ(列)ごとに、最大値を持つインデックスを探す
-            max_indices = np.argmax(amp, axis=0)
-            
+            max_indices = np.argmax(p2, axis=0)
+
             # インデックスを周波数に変換
             peak_freqs = f[max_indices]
-            
+
             # その周波数の強度を取得 (対数dB変換しておく)
             # fancy indexing: [行インデックス配列, 列インデックス配列]
-            peak_powers = 20 * np.log10(amp[max_indices, np.arange(amp.shape[1])] + 1e-9)
+            peak_powers = 10 * np.log10(p2[max_indices, np.arange(p2.shape[1])] + 1e-18)
+
+            # 振幅は保存用にだけ必要なので、p2バッファ上でsqrtを取って流用する
+            amp = np.sqrt(p2, out=p2)
 
-            results[name] = {
+            res = {
                 'f': f,
                 't': t_abs,
                 'Zxx': Zxx,
@@ -75,12 +131,41 @@ class STFTAnalyzer:
                 'peak_power': peak_powers, # 時系列: 強度 [dB]
                 'dt_stft': t[1] - t[0] if len(t) > 1 else 0 # 時間刻み
             }
-            print(f"    ✅ {name}: {len(t)} steps (fs={fs:.0f}Hz) -> Peak Trace Extracted")
+            return name, res, f"    ✅ {name}: {len(t)} steps (fs={fs:.0f}Hz) -> Peak Trace Extracted"
+
+        # ターゲットごとのSTFTは独立で、pocketfftはGILを解放するため
+        # スレッドで並列化できる。短い信号や単一ターゲットでは
+        # プールのオーバーヘッドの方が大きいので直列のまま。
+        parallel = (len(valid_targets) > 1 and
+                    all(len(data_store[n].data) > (1 << 15) for n in valid_targets))
+        if parallel:
+            workers = min(len(valid_targets), os.cpu_count() or 1)
+            with ThreadPoolExecutor(max_workers=workers) as ex:
+                done = list(ex.map(_do_one, valid_targets))
+        else:
+            done = [_do_one(n) for n in valid_targets]
+
+        for name, res, log_line in done:
+            results[name] = res
+            print(log_line)
 
         shot_num = spec_config.get('shot_number', 0)
-        save_path = os.path.join(save_dir, f"shot{shot_num:03d}_stft.pkl")
-        
-        with open(save_path, 'wb') as f:
-            pickle.dump(results, f)
+        if _HAS_H5PY:
+            save_path = os.path.join(save_dir, f"shot{shot_num:03d}_stft.h5")
+            with h5py.File(save_path, 'w') as h5:
+                for name, res in results.items():
+                    grp = h5.create_group(name)
+                    for key in ('f', 't', 'Zxx', 'Amp', 'peak_freq', 'peak_power'):
+                        grp.create_dataset(key, data=res[key])
+                    grp.attrs['fs'] = res['fs']
+                    grp.attrs['unit'] = res['unit']
+                    grp.attrs['dt_stft'] = res['dt_stft']
+        else:
+            save_path = os.path.join(save_dir, f"shot{shot_num:03d}_stft.pkl")
+            # 既定はout-of-bandバッファ形式 (ローダ側でmmapゼロコピー読み出し)。
+            # settings.compress_cache=True (要zstandard) ならzstd圧縮で
+            # ディスクを2〜4倍節約できる (その場合ロードは全展開)。
+            cache_io.dump(results, save_path,
+                          compress=settings.get('compress_cache', False))
         print(f"💾 [STFT] 保存: {save_path}")
         return save_path
\ No newline at end of file
@@ -2,7 +2,7 @@
 from dataclasses import dataclass, field
 import numpy as np
 
-@dataclass
+@dataclass(slots=True)
 class SensorData:
     """
     1つのセンサ（または解析結果）の時系列データを保持するコンテナ。
@@ -14,18 +14,99 @@ class SensorData:
     unit: str = ""        # 単位 (例: "MPa", "K")
     start_time: float = 0.0 # 計測開始時間 [s]
     source: str = ""      # データソース情報 (デバッグ用)
+    # timeのメモ (初回アクセス時に生成。フィルタ類はdata長を変えないので
+    # 長さが一致する限り使い回し、リサイズされたら作り直す)
+    _time: np.ndarray = field(default=None, init=False, repr=False, compare=False)
 
     @property
     def time(self) -> np.ndarray:
         """
-        時間軸配列をオンデマンドで生成して返す。
-        メモリを節約するため、dataとしては持たない。
+        時間軸配列をオンデマンドで生成して返す (生成後はメモ化)。
+        オフセット補正や多項式近似は同じセンサのtimeを繰り返し参照する
+        ため、アクセスごとのN要素アロケートを初回1回にする。
         """
         n = len(self.data)
+        t = self._time
+        if t is not None and len(t) == n:
+            return t
         # t = index / fs + start_time
         if self.fs <= 0:
-            return np.zeros(n)
-        return (np.arange(n) / self.fs) + self.start_time
+            t = np.zeros(n)
+        elif n < 2:
+            t = np.full(n, self.start_time)
+        else:
+            # arange→除算→加算の3パス (int64含む中間配列2本) ではなく、
+            # linspaceの1回のC実装で確保・生成まで済ませる
+            t = np.linspace(self.start_time,
+                            self.start_time + (n - 1) / self.fs,
+                            n, dtype=np.float64)
+        self._time = t
+        return t
+
+    def __getstate__(self):
+        # メモした時間軸はキャッシュに書かない (ロード側で再生成できる)
+        return (self.name, self.data, self.fs, self.unit,
+                self.start_time, self.source)
+
+    def __setstate__(self, state):
+        if isinstance(state, dict):
+            # 旧形式キャッシュ (素のdataclass時代のpickle) は__dict__の
+            # 辞書がstateに入っている。タプル展開するとキー文字列が
+            # 各フィールドに入って静かに壊れるので、辞書から復元する
+            self.name = state['name']
+            self.data = state['data']
+            self.fs = state['fs']
+            self.unit = state.get('unit', "")
+            self.start_time = state.get('start_time', 0.0)
+            self.source = state.get('source', "")
+            self._time = None
+            return
+        self.name, self.data, self.fs, self.unit, \
+            self.start_time, self.source = state
+        self._time = None
+
+    def __repr__(self):
+        return f"<SensorData '{self.name}': {len(self.data)} samples, {self.fs:.1f}Hz, Unit='{self.unit}'>"
+
+
+@dataclass
+class SensorBundle:
+    """
+    同一ファイル由来の複数チャンネルをSoAで保持するコンテナ。
+    データ本体は列優先 (Fortran順) の1枚の行列で、チャンネル単位の
+    アクセスはコピーなしの列ビューになる。
+    """
+    values: np.ndarray      # (n_samples, n_channels) 列優先
+    names: list             # チャンネル名 (列順)
+    fs: np.ndarray          # サンプリングレート [Hz] (チャンネルごと)
+    units: list             # 単位
+    start_times: np.ndarray # 計測開始時間 [s]
+    sources: list           # データソース情報
+
+    def __post_init__(self):
+        self._index = {name: i for i, name in enumerate(self.names)}
+
+    def __contains__(self, name):
+        return name in self._index
+
+    def __len__(self):
+        return len(self.names)
+
+    def __getitem__(self, name) -> SensorData:
+        """チャンネル名からSensorDataビュー (データはゼロコピー) を返す"""
+        i = self._index[name]
+        return SensorData(
+            name=name,
+            data=self.values[:, i],
+            fs=float(self.fs[i]),
+            unit=self.units[i],
+            start_time=float(self.start_times[i]),
+            source=self.sources[i],
+        )
+
+    def to_dict(self):
+        """{name: SensorData} 形式 (従来インターフェース) に展開する"""
+        return {name: self[name] for name in self.names}
 
     def __repr__(self):
-        return f"<SensorData '{self.name}': {len(self.data)} samples, {self.fs:.1f}Hz, Unit='{self.unit}'>"
\ No newline at end of file
+        return f"<SensorBundle {len(self.names)} ch x {self.values.shape[0]} samples>"
\ No newline at end of file
@@ -6,13 +6,216 @@ Optimized for speed using scipy.optimize.
 Fixed torque zero-point issue at rest.
 """
 
+import math
+import os
 import numpy as np
-from scipy.signal import savgol_filter, medfilt
-from scipy.ndimage import gaussian_filter1d
-from scipy.optimize import minimize
+from scipy.signal import savgol_filter
+from scipy.ndimage import gaussian_filter1d, median_filter
+from scipy.optimize import minimize, differential_evolution
+from concurrent.futures import ThreadPoolExecutor
 from structs import SensorData
 import time
 
+try:
+    from numba import njit, prange, types as _nb_types
+    _HAS_NUMBA = True
+except ImportError:
+    _HAS_NUMBA = False
+    prange = range
+    def njit(*args, **kwargs):
+        # Numbaなしでも同じコードパスで動くようにするダミーデコレータ
+        def wrap(func): return func
+        return wrap
+
+# 最熱部のオイラーカーネルだけはシグネチャを明示して即時コンパイルする。
+# 遅延コンパイルだと初回呼び出しごとに型推論が走るが、明示シグネチャ+
+# cache=Trueならディスクキャッシュから直接ロードされ、呼び出し時の
+# 型推論パスも飛ばせる。[::1]は連続配列指定 (呼び出し側で保証する)
+if _HAS_NUMBA:
+    _f8 = _nb_types.float64
+    _euler_jit = njit(
+        _f8[::1](_f8[::1], _f8[::1], _f8, _f8, _f8, _f8, _f8, _f8,
+                 _f8, _f8, _f8),
+        cache=True, fastmath=True)
+else:
+    _euler_jit = njit(cache=True, fastmath=True)
+
+
+@_euler_jit
+def _euler_integrate(t, m_dot_kg_s, k_v, eta_val, r, I_inv,
+                     loss_A, loss_B, cos_alpha, sin_alpha, cos_beta2):
+    """
+    オイラー積分のJITカーネル (rad/sのまま返す)。
+    L-BFGS-B×遅延スイープから1評価ごとに呼ばれる最熱部で、
+    CPythonのままではループのディスパッチが実計算を支配する。
+    渡すのはスカラーとndarrayだけにしてある。
+    """
+    n = t.shape[0]
+    # 全要素はループで書くのでゼロ初期化 (memset1パス) は不要
+    omega_sim = np.empty(n)
+    if n > 0:
+        omega_sim[0] = 0.0
+    current_omega = 0.0
+
+    for i in range(n - 1):
+        dt = t[i + 1] - t[i]
+        if dt <= 0:
+            omega_sim[i + 1] = 0.0  # 従来のゼロ初期化と同じ値を残す
+            continue
+
+        m_curr = m_dot_kg_s[i]
+
+        # --- トルク計算 (展開形) ---
+        V2 = m_curr * k_v
+        V_theta2 = V2 * cos_alpha
+        U = r * current_omega
+
+        W_theta2 = V_theta2 - U
+        W_axial2 = V2 * sin_alpha
+        W2_mag = math.sqrt(W_theta2 * W_theta2 + W_axial2 * W_axial2)
+        V_theta3 = U - (W2_mag * cos_beta2)
+
+        T_fluid = eta_val * m_curr * r * (V_theta2 - V_theta3)
+
+        # --- 損失 ---
+        # 静止時(ほぼ0)は摩擦も0とみなす。分岐なし形にしておくと
+        # 逐次依存ループでの分岐予測ミスを避けられる
+        # (boolの乗算はTrue=1.0/False=0.0)
+        T_loss = (loss_A + loss_B * current_omega) * (current_omega >= 1e-4)
+
+        current_omega += (T_fluid - T_loss) * I_inv * dt
+        current_omega = max(current_omega, 0.0)  # 逆回転防止クランプ
+        omega_sim[i + 1] = current_omega
+
+    return omega_sim
+
+
+@njit(cache=True, fastmath=True)
+def _euler_integrate_sens(t, m_dot_kg_s, A_val, rho, eta_val, r, I_inv,
+                          loss_A, loss_B, cos_alpha, sin_alpha, cos_beta2):
+    """
+    _euler_integrateの前進感度版。状態omegaと一緒に
+    s_A=domega/dA, s_eta=domega/deta を連鎖律で積分して返す。
+    L-BFGS-Bに解析勾配 (jac) を渡すための下請けで、数値微分の
+    3回評価が1回で済む。クランプ発動時は感度も0にリセットする
+    (max(・,0)の劣勾配)。損失ゲートの不連続は無視する。
+    """
+    n = t.shape[0]
+    # こちらも全要素をループで書くのでempty+先頭初期化で足りる
+    omega_sim = np.empty(n)
+    s_A = np.empty(n)
+    s_e = np.empty(n)
+    if n > 0:
+        omega_sim[0] = 0.0
+        s_A[0] = 0.0
+        s_e[0] = 0.0
+    cur = 0.0
+    sA_c = 0.0
+    se_c = 0.0
+    k_v = 1.0 / (rho * A_val)
+    dkv_dA = -k_v / A_val
+
+    for i in range(n - 1):
+        dt = t[i + 1] - t[i]
+        if dt <= 0:
+            omega_sim[i + 1] = 0.0
+            s_A[i + 1] = 0.0
+            s_e[i + 1] = 0.0
+            continue
+
+        m_curr = m_dot_kg_s[i]
+        V2 = m_curr * k_v
+        V_theta2 = V2 * cos_alpha
+        U = r * cur
+        W_theta2 = V_theta2 - U
+        W_axial2 = V2 * sin_alpha
+        W2_mag = math.sqrt(W_theta2 * W_theta2 + W_axial2 * W_axial2)
+        delta = V_theta2 - U + W2_mag * cos_beta2   # = V_theta2 - V_theta3
+        T_fluid = eta_val * m_curr * r * delta
+        gate = 1.0 if cur >= 1e-4 else 0.0
+        T_loss = (loss_A + loss_B * cur) * gate
+        new_omega = cur + (T_fluid - T_loss) * I_inv * dt
+
+        # --- Aに対する感度 (k_v経由の直接項 + omega経由の間接項) ---
+        dV2 = m_curr * dkv_dA
+        dVt2 = dV2 * cos_alpha
+        dU = r * sA_c
+        dW2 = 0.0
+        if W2_mag > 0.0:
+            dW2 = (W_theta2 * (dVt2 - dU) + W_axial2 * (dV2 * sin_alpha)) / W2_mag
+        dTf = eta_val * m_curr * r * (dVt2 - dU + cos_beta2 * dW2)
+        sA_new = sA_c + (dTf - loss_B * sA_c * gate) * I_inv * dt
+
+        # --- etaに対する感度 (T_fluid∝etaの直接項 + omega経由) ---
+        dU = r * se_c
+        dW2 = 0.0
+        if W2_mag > 0.0:
+            dW2 = (W_theta2 * (-dU)) / W2_mag
+        dTf = m_curr * r * delta + eta_val * m_curr * r * (-dU + cos_beta2 * dW2)
+        se_new = se_c + (dTf - loss_B * se_c * gate) * I_inv * dt
+
+        if new_omega < 0.0:
+            new_omega = 0.0
+            sA_new = 0.0
+            se_new = 0.0
+        cur = new_omega
+        sA_c = sA_new
+        se_c = se_new
+        omega_sim[i + 1] = cur
+        s_A[i + 1] = sA_c
+        s_e[i + 1] = se_c
+
+    return omega_sim, s_A, s_e
+
+
+@njit(cache=True, fastmath=True)
+def _interp_zero_fill(t_query, xp, fp):
+    """np.interp(left=0, right=0)相当。t_queryが単調増加前提で線形走査"""
+    n = t_query.shape[0]
+    m = xp.shape[0]
+    out = np.zeros(n)
+    j = 0
+    for i in range(n):
+        x = t_query[i]
+        if x < xp[0] or x > xp[m - 1]:
+            continue
+        while j < m - 2 and xp[j + 1] < x:
+            j += 1
+        dx = xp[j + 1] - xp[j]
+        if dx > 0:
+            out[i] = fp[j] + (fp[j + 1] - fp[j]) * (x - xp[j]) / dx
+        else:
+            out[i] = fp[j]
+    return out
+
+
+@njit(cache=True, fastmath=True, parallel=True)
+def _delay_sweep_rmse(delays, t_sim, flow_t, flow_g_s, mask_idx, target_masked,
+                      k_v, eta_val, r, I_inv, loss_A, loss_B,
+                      cos_alpha, sin_alpha, cos_beta2):
+    """
+    固定シード(A,eta)で全遅延候補のRMSEを一括評価する粗探索カーネル。
+    遅延ごとのシミュレーションは完全に独立なのでprangeでコア並列化。
+    ※並列カーネルなのでワーカースレッドからは呼ばないこと (physicsと同様)
+    """
+    n_d = delays.shape[0]
+    out = np.empty(n_d)
+    to_rpm = 60.0 / (2 * np.pi)
+    for d in prange(n_d):
+        m_dot = _interp_zero_fill(t_sim - delays[d], flow_t, flow_g_s)
+        for i in range(m_dot.shape[0]):
+            m_dot[i] *= 1e-3  # g/s -> kg/s
+        omega = _euler_integrate(t_sim, m_dot, k_v, eta_val, r, I_inv,
+                                 loss_A, loss_B,
+                                 cos_alpha, sin_alpha, cos_beta2)
+        acc = 0.0
+        for k in range(mask_idx.shape[0]):
+            diff = omega[mask_idx[k]] * to_rpm - target_masked[k]
+            acc += diff * diff
+        out[d] = math.sqrt(acc / mask_idx.shape[0])
+    return out
+
+
 class TurbineSimulator:
     """
     タービンのコールドフロー試験における理想挙動シミュレーションと
@@ -22,8 +225,11 @@ class TurbineSimulator:
     速度三角形を厳密に計算してトルクを算出します。
     """
     def __init__(self, config):
-        self.config = config.copy() 
+        self.config = config.copy()
         self._load_params(self.config)
+        # get_target_rpm結果のメモ (直近1件)。fitとprocessが同じ
+        # sensor_rpmに対してmedfilt+savgolを二重に回すのを防ぐ
+        self._target_cache = None
 
     def _load_params(self, config):
         self.I = float(config['I'])
@@ -54,8 +260,15 @@ class TurbineSimulator:
         self.rho = float(config.get('rho', 1.165))
         
         # 角度をラジアンに変換 (これらは全て周方向基準の角度になります)
-        self.alpha_rad = np.radians(self.alpha_deg)
-        self.beta2_rad = np.radians(self.beta2_deg)
+        # スカラーにはnp.radiansのufuncディスパッチより math.radians が速い
+        self.alpha_rad = math.radians(self.alpha_deg)
+        self.beta2_rad = math.radians(self.beta2_deg)
+
+        # 三角関数定数 (解析中は不変。トルク計算のたびにcos/sinを
+        # 引き直さないようここで1回だけ評価しておく)
+        self.cos_alpha = math.cos(self.alpha_rad)
+        self.sin_alpha = math.sin(self.alpha_rad)
+        self.cos_beta2 = math.cos(self.beta2_rad)
         
         # 異常値除去用のリミット
         opt_conf = config.get('optimization', {})
@@ -74,11 +287,22 @@ class TurbineSimulator:
         if eta_ad is not None: self.eta_ad = float(eta_ad)
         if time_delay is not None: self.time_delay = float(time_delay)
 
-    def get_target_rpm(self, sensor_rpm):
-        """最適化のために、前処理（フィルタリング済み）の実測RPMのみを返す"""
-        t = sensor_rpm.time
+    def _filter_common(self, sensor_rpm):
+        """
+        単位変換→異常値補間→中央値フィルタまでの共通前処理 (rad/s)。
+        最適化のターゲットはここまでで十分 (savgolは表示用の化粧)。
+        フィルタ設定が同じで同一オブジェクトならメモを返す
+        (idはオブジェクト解放後に再利用され得るので、参照ごと保持して
+        is比較で確認する)
+        """
+        key = (self.med_win, self.value_limit_rpm)
+        if self._target_cache is not None:
+            c_sensor, c_key, c_result = self._target_cache
+            if c_sensor is sensor_rpm and c_key == key:
+                return c_result
+
         N_raw = sensor_rpm.data.copy()
-        
+
         # 単位変換
         unit_str = str(sensor_rpm.unit).lower()
         if "hz" in unit_str:
@@ -98,78 +322,49 @@ class TurbineSimulator:
                     N_rpm[outlier_mask] = np.interp(x[outlier_mask], x[valid_mask], N_rpm[valid_mask])
                 else:
                     N_rpm[:] = 0.0
-        
+
         # フィルタリング
         omega_exp = N_rpm * (2 * np.pi / 60.0)
+        n = len(omega_exp)
         safe_med_win = self.med_win
-        if len(t) < safe_med_win: 
-            safe_med_win = max(1, len(t) if len(t)%2!=0 else len(t)-1)
-        
-        omega_med = medfilt(omega_exp, kernel_size=safe_med_win)
-        
+        if n < safe_med_win:
+            safe_med_win = max(1, n if n % 2 != 0 else n - 1)
+
+        # medfiltのO(N·k·log k)ソートに対し、ndimage側はヒストグラム系の
+        # ローリング中央値でk=11でも数倍速い。境界はゼロ詰めでなく端値
+        # 複製 (mode='nearest') になるが、RPMトレースではむしろ自然
+        omega_med = median_filter(omega_exp, size=safe_med_win, mode='nearest')
+        self._target_cache = (sensor_rpm, key, omega_med)
+        return omega_med
+
+    def get_target_rpm(self, sensor_rpm):
+        """表示・比較用の実測RPM (共通前処理 + savgolスムージング)"""
+        omega_med = self._filter_common(sensor_rpm)
+        n = len(omega_med)
+
         # 表示・比較用スムージング
-        sg_win = min(15, len(t) if len(t)%2!=0 else len(t)-1)
+        sg_win = min(15, n if n % 2 != 0 else n - 1)
         if sg_win < 3: sg_win = 3
         omega_smooth_disp = savgol_filter(omega_med, window_length=sg_win, polyorder=3)
-        
+
         to_rpm = 60.0 / (2 * np.pi)
         return omega_smooth_disp * to_rpm
 
     def _run_simulation_fast(self, t, m_dot_kg_s, A_val, eta_val):
         """
         最適化ループ用の高速シミュレーションメソッド。
+        積分本体はJITカーネル (_euler_integrate) に委譲する。
         """
-        # 事前計算
+        # 事前計算 (三角定数は_load_paramsで計算済みの属性を使う)
         k_v = 1.0 / (self.rho * A_val)
-        
-        # 三角関数定数
-        cos_alpha = np.cos(self.alpha_rad)
-        sin_alpha = np.sin(self.alpha_rad)
-        cos_beta2 = np.cos(self.beta2_rad)
-        
-        # 結果配列
-        omega_sim = np.zeros_like(t)
-        current_omega = 0.0
-        
-        # ループ定数
-        I_inv = 1.0 / self.I
-        loss_A = self.loss_A
-        loss_B = self.loss_B
-        r = self.r
-        
-        # オイラー積分
-        for i in range(len(t) - 1):
-            dt = t[i+1] - t[i]
-            if dt <= 0: continue
-            
-            m_curr = m_dot_kg_s[i]
-            
-            # --- トルク計算 (展開形) ---
-            V2 = m_curr * k_v
-            V_theta2 = V2 * cos_alpha
-            U = r * current_omega
-            
-            # W_theta2 = V_theta2 - U
-            # W_axial2 = V2 * sin_alpha
-            W_theta2 = V_theta2 - U
-            W2_mag = np.sqrt(W_theta2*W_theta2 + (V2*sin_alpha)**2)
-            V_theta3 = U - (W2_mag * cos_beta2)
-            
-            # T_fluid
-            T_fluid = eta_val * m_curr * r * (V_theta2 - V_theta3)
-            
-            # --- 損失 ---
-            # 静止時(omega=0)の摩擦による逆回転防止 & 0点処理
-            if current_omega < 1e-4: # ほぼ0なら摩擦も0とみなす
-                 T_loss = 0.0
-            else:
-                 T_loss = loss_A + loss_B * current_omega
-
-            net_torque = T_fluid - T_loss
-            
-            current_omega += (net_torque * I_inv) * dt
-            if current_omega < 0: current_omega = 0.0
-            omega_sim[i+1] = current_omega
+
+        omega_sim = _euler_integrate(
+            np.ascontiguousarray(t, dtype=np.float64),
+            np.ascontiguousarray(m_dot_kg_s, dtype=np.float64),
+            k_v, float(eta_val), self.r, 1.0 / self.I,
+            self.loss_A, self.loss_B,
+            self.cos_alpha, self.sin_alpha, self.cos_beta2
+        )
 
         to_rpm = 60.0 / (2 * np.pi)
         return omega_sim * to_rpm
@@ -206,7 +401,17 @@ class TurbineSimulator:
         omega_exp_rad = omega_exp_rpm * (2 * np.pi / 60.0)
         
         omega_for_deriv = gaussian_filter1d(omega_exp_rad, sigma=self.sigma_val)
-        d_omega_dt = np.gradient(omega_for_deriv, t)
+
+        # 等間隔サンプリングなのでnp.gradient(・, t)の非等間隔分岐
+        # (隣接間隔の配列除算つき) を通らず、スカラーdtの中央差分で書く
+        dt = 1.0 / sensor_rpm.fs if sensor_rpm.fs > 0 else (t[1] - t[0])
+        d_omega_dt = np.empty_like(omega_for_deriv)
+        if len(omega_for_deriv) > 1:
+            d_omega_dt[1:-1] = (omega_for_deriv[2:] - omega_for_deriv[:-2]) / (2.0 * dt)
+            d_omega_dt[0] = (omega_for_deriv[1] - omega_for_deriv[0]) / dt
+            d_omega_dt[-1] = (omega_for_deriv[-1] - omega_for_deriv[-2]) / dt
+        else:
+            d_omega_dt[:] = 0.0
         
         # --- 損失トルク計算 (0点補正付き) ---
         # 回転数が非常に低い(例: 10rpm未満)場合は、摩擦項Aを無視して0にする
@@ -245,20 +450,30 @@ class TurbineSimulator:
         return results
 
     def _calc_fluid_torque(self, omega, m_dot):
-        """配列計算用: 実測データ解析に使用"""
-        V2 = m_dot / (self.rho * self.A)
-        V_theta2 = V2 * np.cos(self.alpha_rad)
+        """
+        配列計算用: 実測データ解析に使用。
+        中間配列をin-placeで使い回すfuse版 (一時配列はV2/U/V_theta2と
+        作業バッファの4本だけ。m_dot/omegaは変更しない)。
+        """
+        V2 = m_dot * (1.0 / (self.rho * self.A))
+        V_theta2 = V2 * self.cos_alpha
         U = self.r * omega
-        
-        W_theta2 = V_theta2 - U
-        W_axial2 = V2 * np.sin(self.alpha_rad)
-        W2_mag = np.sqrt(W_theta2**2 + W_axial2**2)
-        
-        W_theta3_mag = W2_mag * np.cos(self.beta2_rad)
-        V_theta3 = U - W_theta3_mag
-        
-        T_ideal = m_dot * self.r * (V_theta2 - V_theta3)
-        return self.eta_ad * T_ideal
+
+        # W2_mag^2 = (V_theta2 - U)^2 + (V2*sin_alpha)^2
+        work = V_theta2 - U
+        work *= work
+        V2 *= self.sin_alpha    # V2はここ以降使わないのでバッファ流用
+        V2 *= V2
+        work += V2
+        np.sqrt(work, out=work)          # = W2_mag
+        work *= self.cos_beta2           # = W_theta3_mag
+
+        # V_theta2 - V_theta3 = V_theta2 - U + W_theta3_mag
+        work += V_theta2
+        work -= U
+        work *= m_dot
+        work *= self.eta_ad * self.r
+        return work
 
 
 class TurbineOptimizer:
@@ -270,7 +485,7 @@ class TurbineOptimizer:
             A_range_mm2=(100, 2000, 10),
             eta_range=(0.0, 1.0, 0.01),
             delay_range=(0.0, 0.0, 1.0),
-            value_limit=None):
+            value_limit=None, global_search=False):
         
         print("🚀 [Optimizer] パラメータ同定 (Scipy Minimize) を開始します...")
         
@@ -283,8 +498,10 @@ class TurbineOptimizer:
         simulator = TurbineSimulator(self.base_config)
         
         # ターゲットデータ準備
+        # 最適化にはsavgolをかけない中央値フィルタ段までを使う
+        # (savgolは表示用で、RMSE評価にはノイズ除去だけで足りる)
         print("   Preparing target data...")
-        N_target = simulator.get_target_rpm(sensor_rpm)
+        N_target = simulator._filter_common(sensor_rpm) * (60.0 / (2 * np.pi))
         t_sim = sensor_rpm.time
         
         # マスク作成 (有効区間のみで評価)
@@ -311,46 +528,147 @@ class TurbineOptimizer:
         
         start_time = time.time()
         
-        # 目的関数
+        # 目的関数 (解析勾配付き)
+        # jacなしのL-BFGS-Bは数値微分で1反復あたり3回シミュレーション
+        # するが、前進感度カーネルなら1回でRMSEと勾配が両方出る。
+        t_arr = np.asarray(t_sim, dtype=np.float64)
+        mask_idx = np.flatnonzero(mask)
+        target_masked = np.asarray(N_target[mask], dtype=np.float64)
+        to_rpm = 60.0 / (2 * np.pi)
+
+        # 質量流量の時刻・値もループ外で連続float64に固定しておく。
+        # mmap由来の非連続ビューだとnp.interpの二分探索が毎回
+        # ストライドアクセスになるし、属性参照も遅延ごとに繰り返さない
+        m_t = np.ascontiguousarray(sensor_m_dot.time, dtype=np.float64)
+        m_y = np.ascontiguousarray(sensor_m_dot.data, dtype=np.float64)
+
         def objective_func(x, current_m_dot):
             A_val, eta_val = x
-            
-            # シミュレーション実行 (スケーリング引数なし)
-            N_sim = simulator._run_simulation_fast(t_sim, current_m_dot, A_val, eta_val)
-            
-            diff = N_sim[mask] - N_target[mask]
-            rmse = np.sqrt(np.mean(diff**2))
-            return rmse
 
-        total_delays = len(delay_vals)
-        print(f"   Searching across {total_delays} delay steps...")
-        
-        for idx, delay in enumerate(delay_vals):
-            t_query = t_sim - delay
-            m_dot_g_s = np.interp(t_query, sensor_m_dot.time, sensor_m_dot.data, left=0.0, right=0.0)
-            m_dot_kg_s = m_dot_g_s / 1000.0
-            
-            res = minimize(
-                objective_func, 
-                x0, 
-                args=(m_dot_kg_s,),
-                method='L-BFGS-B',
-                bounds=bounds,
-                tol=1e-4
+            omega, s_A, s_e = _euler_integrate_sens(
+                t_arr, current_m_dot, float(A_val), simulator.rho,
+                float(eta_val), simulator.r, 1.0 / simulator.I,
+                simulator.loss_A, simulator.loss_B,
+                simulator.cos_alpha, simulator.sin_alpha, simulator.cos_beta2
             )
+
+            diff = omega[mask_idx] * to_rpm - target_masked
+            rmse = np.sqrt(np.mean(diff ** 2))
+            if rmse <= 0.0:
+                return 0.0, np.zeros(2)
+            # d(rmse)/dp = mean(diff * domega/dp * to_rpm) / rmse
+            g_A = np.mean(diff * s_A[mask_idx]) * to_rpm / rmse
+            g_eta = np.mean(diff * s_e[mask_idx]) * to_rpm / rmse
+            return rmse, np.array([g_A, g_eta])
+
+        # 大域探索モード: (A_eff, eta, delay) の3変数を
+        # differential_evolutionで同時に最適化する。候補集団の評価は
+        # JITカーネル内でGILが外れるためスレッドmapでコア並列化できる
+        # (updating='deferred'が必要)。粗探索+精密化の既定経路より
+        # 評価回数は増えるが、遅延グリッドに乗らない解や多峰的な
+        # ケースの保険として使える。seed固定で結果は再現可能。
+        if global_search:
+            bounds3 = bounds + [(float(delay_vals[0]), float(delay_vals[-1]))]
+            rho = simulator.rho
+            sim_args = (simulator.r, 1.0 / simulator.I,
+                        simulator.loss_A, simulator.loss_B,
+                        simulator.cos_alpha, simulator.sin_alpha,
+                        simulator.cos_beta2)
+
+            def objective3(x):
+                m_dot = np.interp(t_arr - x[2], m_t, m_y, left=0.0, right=0.0)
+                m_dot *= 1e-3
+                omega = _euler_integrate(
+                    t_arr, m_dot, 1.0 / (rho * x[0]), float(x[1]), *sim_args)
+                diff = omega[mask_idx] * to_rpm - target_masked
+                return float(np.sqrt(np.mean(diff ** 2)))
+
+            workers = os.cpu_count() or 1
+            print(f"   Global search (differential_evolution, {workers} threads)...")
+            with ThreadPoolExecutor(max_workers=workers) as ex:
+                de_res = differential_evolution(
+                    objective3, bounds3, tol=1e-4, seed=0, polish=True,
+                    updating='deferred',
+                    workers=lambda func, xs: list(ex.map(func, xs)))
+            best_global_score = de_res.fun
+            best_global_params = {
+                'A_eff_mm2': de_res.x[0] * 1e6,
+                'eta_ad': de_res.x[1],
+                'delay': de_res.x[2],
+                'rmse': de_res.fun
+            }
+        else:
+            # 粗探索: 固定シード(A,eta)=x0で全遅延のRMSEをprangeカーネルで
+            # 一括評価し、上位候補だけをL-BFGS-Bで精密化する。
+            # 遅延ごとにminimizeを回す従来方式 (シミュレーション数十回×遅延数)
+            # に比べて、外れの遅延は1評価で足切りできる。
+            refine_vals = delay_vals
+            if _HAS_NUMBA and len(delay_vals) > 3 and np.sum(mask) > 0:
+                # シードは中央の遅延で1回だけminimizeして得た(A,eta)を使う。
+                # 初期推定値のままだと遅延感度がA/etaの誤差に埋もれて
+                # ランキングが当てにならない。
+                seed_delay = float(delay_vals[len(delay_vals) // 2])
+                m_seed = np.interp(t_arr - seed_delay, m_t, m_y,
+                                   left=0.0, right=0.0) / 1000.0
+                seed_res = minimize(objective_func, x0, args=(m_seed,), jac=True,
+                                    method='L-BFGS-B', bounds=bounds, tol=1e-4)
+                x0 = seed_res.x
+
+                print(f"   Coarse sweep across {len(delay_vals)} delay steps (parallel)...")
+                coarse = _delay_sweep_rmse(
+                    np.asarray(delay_vals, dtype=np.float64),
+                    t_arr, m_t, m_y,
+                    mask_idx, target_masked,
+                    1.0 / (simulator.rho * x0[0]), x0[1],
+                    simulator.r, 1.0 / simulator.I,
+                    simulator.loss_A, simulator.loss_B,
+                    simulator.cos_alpha, simulator.sin_alpha, simulator.cos_beta2
+                )
+                order = np.argsort(coarse)
+                refine_vals = delay_vals[order[:3]]
+                print(f"   Coarse best: Delay={delay_vals[order[0]]:.3f}s "
+                      f"(RMSE={coarse[order[0]]:.2f}) -> refining top {len(refine_vals)}")
+
+            total_delays = len(refine_vals)
+            print(f"   Searching across {total_delays} delay steps...")
+
+            # 精密化対象の遅延ぶんの流量はブロードキャストで一括補間しておく
+            # (np.interpのC呼び出しが遅延数回→1回になる)。クエリ行列が
+            # 巨大にならないよう10遅延ずつに区切る
+            m_dot_rows = np.empty((total_delays, t_arr.shape[0]))
+            for s in range(0, total_delays, 10):
+                sub = np.asarray(refine_vals[s:s + 10], dtype=np.float64)
+                t_queries = t_arr[None, :] - sub[:, None]
+                m_dot_rows[s:s + len(sub)] = np.interp(
+                    t_queries.ravel(), m_t, m_y, left=0.0, right=0.0
+                ).reshape(len(sub), -1)
+            m_dot_rows *= 1e-3  # g/s -> kg/s
+
+            for idx, delay in enumerate(refine_vals):
+                m_dot_kg_s = m_dot_rows[idx]
+            
+                res = minimize(
+                    objective_func,
+                    x0,
+                    args=(m_dot_kg_s,),
+                    jac=True,
+                    method='L-BFGS-B',
+                    bounds=bounds,
+                    tol=1e-4
+                )
             
-            if res.fun < best_global_score:
-                best_global_score = res.fun
-                best_global_params = {
-                    'A_eff_mm2': res.x[0] * 1e6,
-                    'eta_ad': res.x[1],
-                    'delay': delay,
-                    'rmse': res.fun
-                }
-                x0 = res.x
+                if res.fun < best_global_score:
+                    best_global_score = res.fun
+                    best_global_params = {
+                        'A_eff_mm2': res.x[0] * 1e6,
+                        'eta_ad': res.x[1],
+                        'delay': delay,
+                        'rmse': res.fun
+                    }
+                    x0 = res.x
             
-            if (idx+1) % 5 == 0 or (idx+1) == total_delays:
-                print(f"   Step {idx+1}/{total_delays}: Delay={delay:.3f}s -> RMSE={res.fun:.2f}")
+                if (idx+1) % 5 == 0 or (idx+1) == total_delays:
+                    print(f"   Step {idx+1}/{total_delays}: Delay={delay:.3f}s -> RMSE={res.fun:.2f}")
 
         elapsed = time.time() - start_time
         print(f"\n✅ 高速最適化完了 ({elapsed:.1f}s)")
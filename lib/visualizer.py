@@ -1,44 +1,219 @@
 # -*- coding: utf-8 -*-
 import os
 import platform
+import matplotlib
 import matplotlib.pyplot as plt
 from matplotlib.ticker import AutoMinorLocator
+from matplotlib.collections import LineCollection
+from matplotlib.colors import Normalize
+from matplotlib.lines import Line2D
 from cycler import cycler
 import pickle
 import numpy as np
 
+try:
+    from . import cache_io
+except ImportError:
+    import cache_io
+
+try:
+    import h5py
+    _HAS_H5PY = True
+except ImportError:
+    _HAS_H5PY = False
+
 # ★ Fittingモジュールをインポート
 try:
     from .fitting import CoastingFitter
 except ImportError:
     from fitting import CoastingFitter
 
+# numbaがあれば長大な時系列の間引き (LTTB) をJITで回す
+try:
+    from numba import njit
+    _HAS_NUMBA = True
+except ImportError:
+    _HAS_NUMBA = False
+    def njit(*args, **kwargs):
+        def wrapper(func):
+            return func
+        return wrapper
+
+
+@njit(cache=True)
+def _lttb_kernel(x, y, n_out):
+    """
+    LTTB (Largest-Triangle-Three-Buckets) による知覚的間引き。
+    点列をn_out個のバケットに分け、前回採用点と次バケット平均とで
+    作る三角形の面積が最大の点を各バケットから選ぶ。ピークや段差を
+    落とさずに点数を1/100以下にできる。
+    """
+    n = x.shape[0]
+    out_x = np.empty(n_out)
+    out_y = np.empty(n_out)
+    out_x[0] = x[0]
+    out_y[0] = y[0]
+    out_x[n_out - 1] = x[n - 1]
+    out_y[n_out - 1] = y[n - 1]
+
+    every = (n - 2) / (n_out - 2)
+    a = 0
+    for i in range(n_out - 2):
+        start = int(i * every) + 1
+        end = int((i + 1) * every) + 1
+
+        # 次バケットの重心
+        avg_end = int((i + 2) * every) + 1
+        if avg_end > n:
+            avg_end = n
+        avg_x = 0.0
+        avg_y = 0.0
+        for j in range(end, avg_end):
+            avg_x += x[j]
+            avg_y += y[j]
+        cnt = avg_end - end
+        if cnt > 0:
+            avg_x /= cnt
+            avg_y /= cnt
+
+        max_area = -1.0
+        chosen = start
+        for j in range(start, end):
+            area = abs((x[a] - avg_x) * (y[j] - y[a])
+                       - (x[a] - x[j]) * (avg_y - y[a]))
+            if area > max_area:
+                max_area = area
+                chosen = j
+        out_x[i + 1] = x[chosen]
+        out_y[i + 1] = y[chosen]
+        a = chosen
+    return out_x, out_y
+
+
+@njit(cache=True)
+def _nan_mean_max(seg):
+    """
+    区間統計のMeanとMaxを1パスで計算する (NaNは無視)。
+    np.nanmean + np.nanmaxだと同じ区間を2回走査することになり、
+    長い区間ではメモリ帯域で律速される。
+    """
+    total = 0.0
+    cnt = 0
+    mx = -np.inf
+    for i in range(seg.shape[0]):
+        v = seg[i]
+        if not np.isnan(v):
+            total += v
+            cnt += 1
+            if v > mx:
+                mx = v
+    if cnt == 0:
+        return np.nan, np.nan
+    return total / cnt, mx
+
+
+def _decimate_lttb(x, y, n_out=2000):
+    """
+    描画用の間引き。十分短い系列とnumbaなし環境ではそのまま返す
+    (純Python版LTTBは全点ループで本末転倒のため)。
+    """
+    if not _HAS_NUMBA or len(x) <= 4 * n_out:
+        return x, y
+    return _lttb_kernel(np.ascontiguousarray(x, dtype=np.float64),
+                        np.ascontiguousarray(y, dtype=np.float64), n_out)
+
+
+def _configure_matplotlib():
+    """
+    Matplotlibのスタイル設定。インスタンスごとではなくモジュール
+    インポート時に1回だけ適用する (ショットごとにVisualizerを作る
+    バッチ構成で、rcParams書き込みとplatform.system()の繰り返しを省く)。
+    """
+    plt.rcParams['font.family'] = 'serif'
+    plt.rcParams['mathtext.fontset'] = 'stix' # 数式フォントはSTIX (Times風)
+    plt.rcParams['font.size'] = 12
+    plt.rcParams['xtick.direction'] = 'in'
+    plt.rcParams['ytick.direction'] = 'in'
+    plt.rcParams['axes.grid'] = False
+    plt.rcParams['axes.prop_cycle'] = cycler(color=['black', 'red', 'blue', 'green', 'purple'])
+
+    plt.rcParams['xtick.minor.visible'] = True
+    plt.rcParams['ytick.minor.visible'] = True
+
+    # サブピクセルの頂点を落としてから描く (高密度の時系列で
+    # savefigが数倍速くなる。見た目は1px未満の差しか出ない)
+    plt.rcParams['path.simplify'] = True
+    plt.rcParams['path.simplify_threshold'] = 1.0
+
+    # savefig.bboxが'tight'だとbbox計測のためにレンダリングが毎回
+    # 2回走る。余白は各プロットでsubplots_adjustにより固定済みなので
+    # 'standard' (1回レンダリング) を明示しておく
+    plt.rcParams['savefig.bbox'] = 'standard'
+    plt.rcParams['savefig.pad_inches'] = 0.1
+
+    system = platform.system()
+    if system == 'Windows':
+        # ★修正: Times New Roman を先頭に移動 (英数字はTimes, 日本語はMS明朝)
+        plt.rcParams['font.serif'] = ['Times New Roman', 'MS Mincho']
+    elif system == 'Darwin':
+        # Macの場合も同様
+        plt.rcParams['font.serif'] = ['Times New Roman', 'Hiragino Mincho ProN']
+
+
+_configure_matplotlib()
+
+# 並列描画ワーカーのプロセスローカル状態 (_init_render_worker参照)
+_WORKER_CTX = {}
+
+
+def _init_render_worker(output_dir, shared_ranges, data_store, shot_name,
+                        default_dpi):
+    """
+    ProcessPoolExecutorのワーカー初期化。data_storeはinitargs経由で
+    ワーカーごとに1回だけpickleされる (タスクごとに送り直さない)。
+    ワーカー内に自前のVisualizerを作り、親で確定済みの共有時間レンジと
+    プランのdefault_dpiを引き継ぐ。
+    """
+    viz = Visualizer(output_dir)
+    viz.shared_time_ranges = shared_ranges
+    viz._default_dpi = default_dpi
+    _WORKER_CTX['viz'] = viz
+    _WORKER_CTX['data_store'] = data_store
+    _WORKER_CTX['shot_name'] = shot_name
+
+
+def _render_one_task(task, stft_slice):
+    """
+    1タスクをワーカー側で描画・保存する。例外はプロセス境界を越えて
+    親のmapを止めないよう、文字列にして返す (Noneなら成功)。
+    """
+    viz = _WORKER_CTX['viz']
+    try:
+        viz._dispatch_task(task, _WORKER_CTX['data_store'], stft_slice,
+                           _WORKER_CTX['shot_name'])
+        return None
+    except Exception as e:
+        return f"{task.get('title', task.get('type'))}: {e}"
+
+
 class Visualizer:
     def __init__(self, output_dir):
         self.output_dir = output_dir
         self.figures_dir = os.path.join(output_dir, "figures")
         self.shared_time_ranges = {}
-        
-        # --- Matplotlib設定 ---
-        plt.rcParams['font.family'] = 'serif'
-        plt.rcParams['mathtext.fontset'] = 'stix' # 数式フォントはSTIX (Times風)
-        plt.rcParams['font.size'] = 12
-        plt.rcParams['xtick.direction'] = 'in'
-        plt.rcParams['ytick.direction'] = 'in'
-        plt.rcParams['axes.grid'] = False
-        plt.rcParams['axes.prop_cycle'] = cycler(color=['black', 'red', 'blue', 'green', 'purple'])
-        
-        plt.rcParams['xtick.minor.visible'] = True
-        plt.rcParams['ytick.minor.visible'] = True
-        
-        system = platform.system()
-        if system == 'Windows':
-            # ★修正: Times New Roman を先頭に移動 (英数字はTimes, 日本語はMS明朝)
-            plt.rcParams['font.serif'] = ['Times New Roman', 'MS Mincho']
-        elif system == 'Darwin':
-            # Macの場合も同様
-            plt.rcParams['font.serif'] = ['Times New Roman', 'Hiragino Mincho ProN']
-            
+        # STFTキャッシュの読み込み結果 {path: (mtime, data)}。
+        # ショットごとに複数のプランファイルでvisualize()を呼ぶ構成だと
+        # 同じ数百MBのキャッシュを毎回デシリアライズすることになるため
+        self.stft_data_cache = {}
+        # figsizeごとの使い回しFigure (Aggのみ。_get_figure参照)
+        self._fig_cache = {}
+        # クリップ範囲 (vmin, vmax) ごとのNormalize (_plot_spectrogram参照)
+        self._norm_cache = {}
+        # プランのdefault_dpi (visualize()で上書き)。PNGエンコード時間は
+        # ピクセル数に比例するので、試行錯誤中はプラン側で150等に
+        # 下げると保存が約4倍速い。最終版だけ300で焼き直す運用を想定
+        self._default_dpi = 300
+
         # フィッティングエンジンの初期化
         self.fitter = CoastingFitter()
 
@@ -55,6 +230,67 @@ class Visualizer:
             
         return f"{base} \\times 10^{{{exp_val}}}"
 
+    def _get_figure(self, figsize):
+        """
+        (fig, ax) を返す。Aggバックエンドではfigsizeごとに1枚のFigureを
+        キャッシュして使い回す — Figureの生成・破棄はAxes/キャンバスの
+        組み立てが重く、小さな図を何十枚も保存するバッチでは描画本体と
+        同程度かかる。再利用時はtwinxやカラーバーで増えたAxesを外し、
+        主軸をcla()でクリアして返す。GUI/インライン環境ではPlotsペインに
+        図を残すため従来どおり毎回新規作成する。
+        """
+        if matplotlib.get_backend().lower() != 'agg':
+            return plt.subplots(figsize=figsize)
+
+        key = tuple(figsize)
+        fig = self._fig_cache.get(key)
+        if fig is None:
+            fig, ax = plt.subplots(figsize=figsize)
+            self._fig_cache[key] = fig
+            return fig, ax
+
+        for extra_ax in fig.axes[1:]:
+            extra_ax.remove()
+        ax = fig.axes[0]
+        ax.cla()
+        return fig, ax
+
+    def _savefig(self, fig, save_path, opts):
+        """
+        plot_optionsのsave_format/save_dpiを反映して保存する。
+        PNGのzlib圧縮は図1枚あたりの保存時間のかなりの部分を占めるので、
+        画質が問題にならないレポート用途では save_format: jpg
+        (quality 85) でエンコードが数倍速くなる。既定は従来どおり
+        png/300dpi。実際の保存パスを返す (拡張子が変わり得るため)。
+        """
+        fmt = str(opts.get('save_format', 'png')).lower().lstrip('.')
+        dpi = opts.get('save_dpi', self._default_dpi)
+        if fmt in ('jpg', 'jpeg'):
+            save_path = os.path.splitext(save_path)[0] + '.jpg'
+            fig.savefig(save_path, dpi=dpi, format='jpg', bbox_inches=None,
+                        pil_kwargs={'quality': 85, 'optimize': False})
+        else:
+            # PNGのzlib圧縮は既定のレベル6が重く、エンコードが保存時間の
+            # 大半を占める。レベル1でCPUがほぼ半減し、ファイルサイズの
+            # 増加は数割で済む (plot_optionsのpng_compress_levelで変更可)
+            fig.savefig(save_path, dpi=dpi, bbox_inches=None,
+                        pil_kwargs={'compress_level':
+                                    opts.get('png_compress_level', 1)})
+        return save_path
+
+    def _finalize_figure(self, fig):
+        """
+        show()で表示した上で、非GUIバックエンド (Aggでのバッチ実行) では
+        図を閉じてメモリを返す。SpyderのPlotsペイン等のGUI/インライン
+        環境では従来どおり開いたままにする (close()しない理由は各所の
+        コメント参照)。キャッシュ済みの使い回しFigureは次のタスクの
+        ために閉じない。
+        """
+        plt.show()
+        if (matplotlib.get_backend().lower() == 'agg'
+                and fig not in self._fig_cache.values()):
+            plt.close(fig)
+
     def visualize(self, plan_config, data_store=None, stft_pkl_path=None, shot_name=None):
         if isinstance(plan_config, list):
             if len(plan_config) > 0 and isinstance(plan_config[0], dict):
@@ -72,12 +308,28 @@ class Visualizer:
 
         print(f"  [Visualizer] 描画処理を開始します...")
         os.makedirs(self.figures_dir, exist_ok=True)
-        self.shared_time_ranges = {} 
+        self.shared_time_ranges = {}
+        self._default_dpi = plan_config.get('default_dpi', 300)
 
         stft_data = None
         if stft_pkl_path and os.path.exists(stft_pkl_path):
             try:
-                with open(stft_pkl_path, 'rb') as f: stft_data = pickle.load(f)
+                # mtimeが変わっていなければ前回のデシリアライズ結果を使い回す
+                mtime = os.path.getmtime(stft_pkl_path)
+                cached = self.stft_data_cache.get(stft_pkl_path)
+                if cached is not None and cached[0] == mtime:
+                    stft_data = cached[1]
+                elif stft_pkl_path.endswith('.h5') and _HAS_H5PY:
+                    # スペクトログラム描画に必要なデータセットだけ読む
+                    stft_data = {}
+                    with h5py.File(stft_pkl_path, 'r') as h5:
+                        for name, grp in h5.items():
+                            stft_data[name] = {k: grp[k][()] for k in grp.keys()}
+                            stft_data[name].update(grp.attrs)
+                    self.stft_data_cache[stft_pkl_path] = (mtime, stft_data)
+                else:
+                    stft_data = cache_io.load(stft_pkl_path)
+                    self.stft_data_cache[stft_pkl_path] = (mtime, stft_data)
             except: pass
 
         providers = []
@@ -98,16 +350,53 @@ class Visualizer:
         
         sorted_tasks = providers + others + consumers
 
+        # parallel_render=True (プランのトップレベル) でタスクをプロセス
+        # プールに分配する。Aggのレンダリング・PNG圧縮はC側でCPUを使う
+        # ためスレッドでは並ばない。定義レンジのprovidersは依存元なので
+        # 常に直列で先に描き、残り (others+consumers) だけ並列化する。
+        # GUIバックエンドでは子プロセスに図を出せないので直列のまま。
+        parallel_rest = []
+        if (plan_config.get('parallel_render', False)
+                and matplotlib.get_backend().lower() == 'agg'
+                and len(others) + len(consumers) > 1):
+            parallel_rest = others + consumers
+            sorted_tasks = providers
+
         for task in sorted_tasks:
-            kind = task.get('type')
-            if kind == 'timeseries':
-                if data_store: self._plot_timeseries(data_store, task)
-            elif kind == 'stft_spectrogram':
-                if stft_data: self._plot_spectrogram(stft_data, task, shot_name)
-            elif kind == 'coasting_fit':
-                if data_store: self._plot_coasting_fit(data_store, task, shot_name)
-            elif kind == 'scatter': # ★追加
-                self._plot_scatter(task)
+            self._dispatch_task(task, data_store, stft_data, shot_name)
+
+        if parallel_rest:
+            from concurrent.futures import ProcessPoolExecutor
+            # STFTデータは該当タスクにだけ、対象1本分に絞って送る
+            # (数百MBのキャッシュ全体を全タスクにpickleしない)
+            slices = []
+            for task in parallel_rest:
+                target = task.get('target')
+                if (task.get('type') == 'stft_spectrogram'
+                        and stft_data and target in stft_data):
+                    slices.append({target: stft_data[target]})
+                else:
+                    slices.append(None)
+            workers = min(os.cpu_count() or 1, len(parallel_rest))
+            with ProcessPoolExecutor(
+                    max_workers=workers,
+                    initializer=_init_render_worker,
+                    initargs=(self.output_dir, self.shared_time_ranges,
+                              data_store, shot_name, self._default_dpi)) as ex:
+                for err in ex.map(_render_one_task, parallel_rest, slices):
+                    if err:
+                        print(f"    ❌ [並列描画] タスク失敗: {err}")
+
+    def _dispatch_task(self, task, data_store, stft_data, shot_name):
+        kind = task.get('type')
+        if kind == 'timeseries':
+            if data_store: self._plot_timeseries(data_store, task)
+        elif kind == 'stft_spectrogram':
+            if stft_data: self._plot_spectrogram(stft_data, task, shot_name)
+        elif kind == 'coasting_fit':
+            if data_store: self._plot_coasting_fit(data_store, task, shot_name)
+        elif kind == 'scatter': # ★追加
+            self._plot_scatter(task)
 
     def _plot_timeseries(self, data_store, task):
         title = task.get('title', 'Untitled')
@@ -126,7 +415,7 @@ class Visualizer:
         figsize = (7, 5)
         if opts.get('aspect_ratio') == 'square': figsize = (6, 6)
 
-        fig, ax1 = plt.subplots(figsize=figsize)
+        fig, ax1 = self._get_figure(figsize)
         fig.subplots_adjust(left=margin_left, right=margin_right, bottom=margin_bottom, top=margin_top)
         
         y1_cols = task.get('y', [])
@@ -134,32 +423,73 @@ class Visualizer:
         y2_cols = task.get('secondary_y', [])
         if isinstance(y2_cols, str): y2_cols = [y2_cols]
 
+        # 色サイクルはクロージャ外で1回だけ展開 (by_key()のdict構築を
+        # 系列ごとに繰り返さない)
+        cycle_colors = plt.rcParams['axes.prop_cycle'].by_key().get(
+            'color', ['black'])
+
         def _plot_on_ax(ax, target_names, linestyle_default='-'):
+            # マーカーなしの純粋な折れ線はLineCollectionに集めて一括描画
+            # する (系列ごとのax.plotはArtist生成が重く、系列数が多いと
+            # ここが描画のボトルネックになる)。凡例はプロキシLine2Dで作る。
             lines = []
-            for i, name in enumerate(target_names):
+            segments = []
+            seg_colors = []
+            seg_styles = []
+            color_idx = 0
+            for name in target_names:
                 if name not in data_store:
                     print(f"    ⚠️ データなし: {name}")
                     continue
-                
+
                 sensor = data_store[name]
                 x = sensor.time
-                y = sensor.data.copy()
-                
+
+                # 描画は読み取りのみなのでコピーは不要。rpm換算のときだけ
+                # 乗算で新しい配列ができる
                 freq_unit = opts.get('frequency_unit', 'Hz')
-                if freq_unit.lower() == 'rpm': y = y * 60.0
-                
+                if freq_unit.lower() == 'rpm':
+                    y = sensor.data * 60.0
+                else:
+                    y = sensor.data
+
+                # Aggの線描画コストはセグメント数に比例するので、数百万点の
+                # 生波形は描画前にLTTBで~2000点まで間引く (decimate: false
+                # でオフにできる。統計計算は間引き前の全点データを使う)
+                if opts.get('decimate', True):
+                    x, y = _decimate_lttb(x, y)
+
                 series_conf = opts.get('series_styles', {}).get(name, {})
                 legend_map = opts.get('legend_labels', {})
                 mapped_name = legend_map.get(name, name)
                 label = series_conf.get('label', mapped_name)
-                
+
                 ls = series_conf.get('linestyle', opts.get('linestyle', linestyle_default))
                 marker = series_conf.get('marker', opts.get('marker', None))
                 ms = series_conf.get('markersize', opts.get('markersize', None))
                 color = series_conf.get('color', opts.get('color', None))
-                
-                ln, = ax.plot(x, y, label=label, linestyle=ls, marker=marker, markersize=ms, color=color, linewidth=1.5)
-                lines.append(ln)
+
+                # 色は軸のサイクラに任せず自前で回す (コレクション行きの
+                # 系列とax.plot行きの系列で色が重複しないように)
+                if color is None:
+                    color = cycle_colors[color_idx % len(cycle_colors)]
+                    color_idx += 1
+
+                if marker is None:
+                    segments.append(np.column_stack([x, y]))
+                    seg_colors.append(color)
+                    seg_styles.append(ls)
+                    lines.append(Line2D([], [], label=label, linestyle=ls,
+                                        color=color, linewidth=1.5))
+                else:
+                    ln, = ax.plot(x, y, label=label, linestyle=ls, marker=marker, markersize=ms, color=color, linewidth=1.5)
+                    lines.append(ln)
+
+            if segments:
+                ax.add_collection(LineCollection(
+                    segments, colors=seg_colors, linestyles=seg_styles,
+                    linewidths=1.5))
+                ax.autoscale_view()
             return lines
 
         lines1 = _plot_on_ax(ax1, y1_cols, '-')
@@ -201,10 +531,13 @@ class Visualizer:
             if target_name in data_store:
                 sensor = data_store[target_name]
                 t = sensor.time
-                d = sensor.data.copy()
 
+                # こちらも読み取り専用 (マスク抽出は新しい配列を返す)
                 freq_unit = opts.get('frequency_unit', 'Hz')
-                if freq_unit.lower() == 'rpm': d = d * 60.0
+                if freq_unit.lower() == 'rpm':
+                    d = sensor.data * 60.0
+                else:
+                    d = sensor.data
 
                 t_start, t_end = None, None
                 
@@ -231,11 +564,15 @@ class Visualizer:
                             thresh_ratio = float(stats_conf.get('threshold', 0.95))
                             thresh_val = max_val * thresh_ratio
                             
-                            valid_indices = np.where((d >= thresh_val) & search_mask)[0]
-                            
-                            if len(valid_indices) > 0:
-                                t_start = t[valid_indices[0]]
-                                t_end = t[valid_indices[-1]]
+                            # 欲しいのは最初と最後の交差位置だけなので、
+                            # np.whereで全インデックス配列を作らずargmaxで
+                            # 両端から探す (逆順ビューはコピーしない)
+                            cross = (d >= thresh_val) & search_mask
+                            if cross.any():
+                                first = cross.argmax()
+                                last = len(cross) - 1 - cross[::-1].argmax()
+                                t_start = t[first]
+                                t_end = t[last]
                                 if 'define_range' in stats_conf:
                                     def_name = stats_conf['define_range']
                                     self.shared_time_ranges[def_name] = (t_start, t_end)
@@ -249,8 +586,12 @@ class Visualizer:
                         segment = segment[segment <= float(value_limit)]
 
                     if len(segment) > 0:
-                        mean_val = np.nanmean(segment)
-                        max_val_seg = np.nanmax(segment)
+                        if _HAS_NUMBA:
+                            mean_val, max_val_seg = _nan_mean_max(
+                                np.ascontiguousarray(segment, dtype=np.float64))
+                        else:
+                            mean_val = np.nanmean(segment)
+                            max_val_seg = np.nanmax(segment)
                         lc = stats_conf.get('color', 'red')
                         ax1.axvline(t_start, color=lc, linestyle=':', linewidth=1.5, alpha=0.8)
                         ax1.axvline(t_end, color=lc, linestyle=':', linewidth=1.5, alpha=0.8)
@@ -270,12 +611,8 @@ class Visualizer:
 
         safe_title = title.replace(" ", "_").replace("/", "-")
         save_path = os.path.join(self.figures_dir, f"{safe_title}.png")
-        plt.savefig(save_path, dpi=300)
-        
-        # ★ここを変更: close()せずにshow()する
-        plt.show()
-        # plt.close() # SpyderのPlotsペインに表示させるためコメントアウト
-        
+        save_path = self._savefig(fig, save_path, opts)
+        self._finalize_figure(fig)
         print(f"    📈 保存: {os.path.basename(save_path)}")
 
     def _plot_spectrogram(self, stft_all_data, task, shot_name):
@@ -284,7 +621,14 @@ class Visualizer:
         
         data = stft_all_data[target]
         f, t, Amp = data['f'], data['t'], data['Amp']
-        spec_db = 20 * np.log10(Amp + 1e-9)
+        # dB化はFP32バッファ1本の上でin-placeに行う。20*log10(Amp+1e-9)を
+        # 素直に書くと全スペクトログラムサイズの一時配列が2本できる。
+        # 表示用途なのでFP32で十分 (pcolormeshも内部でfloat32に落とす)。
+        # Ampはmmap由来の読み取り専用ビューのことがあるためastypeで複製
+        spec_db = Amp.astype(np.float32, copy=True)
+        spec_db += 1e-9
+        np.log10(spec_db, out=spec_db)
+        spec_db *= 20.0
         opts = task.get('plot_options', {})
 
         freq_unit = opts.get('frequency_unit', 'Hz')
@@ -300,21 +644,63 @@ class Visualizer:
         margin_bottom = 0.20 # 元 0.15 -> 0.22 -> 0.20
         margin_top = 0.95    # 元 0.90
         
-        fig, ax = plt.subplots(figsize=(7, 5))
+        fig, ax = self._get_figure((7, 5))
         fig.subplots_adjust(left=margin_left, right=margin_right, bottom=margin_bottom, top=margin_top)
-        
-        vmin = np.percentile(spec_db, 5)
-        vmax = np.percentile(spec_db, 99)
-        if opts.get('c_lim'): vmin, vmax = opts['c_lim']
 
-        mesh = ax.pcolormesh(t, f, spec_db, cmap=opts.get('cmap', 'jet'), shading='gouraud', vmin=vmin, vmax=vmax)
+        # 出力解像度 (figsize×300dpi ≒ 2100×1500px) を大きく超えるメッシュは
+        # 1ピクセル未満のクワッドを何百万個も描くだけなので、ブロック平均で
+        # 先に間引く。PNG書き出しが支配的な大型STFTで描画が1桁速くなる
+        nf, nt = spec_db.shape
+        target_nt = int(fig.get_size_inches()[0] * 300)
+        target_nf = int(fig.get_size_inches()[1] * 300)
+        bt = max(1, nt // target_nt)
+        bf = max(1, nf // target_nf)
+        if bt > 1 or bf > 1:
+            nf_r, nt_r = nf // bf, nt // bt
+            spec_db = spec_db[:nf_r * bf, :nt_r * bt] \
+                .reshape(nf_r, bf, nt_r, bt).mean(axis=(1, 3))
+            f = f[::bf][:nf_r]
+            t = t[::bt][:nt_r]
+
+        if opts.get('c_lim'):
+            vmin, vmax = opts['c_lim']
+        else:
+            # np.percentileは全ソートO(N log N)。カラースケールの2点だけ
+            # ならnp.partitionの選択O(N)で足りる (両方のkを1回で渡せる)。
+            # 線形補間がなくなり隣接要素ぶんだけ値がずれ得るが、表示の
+            # クリップ範囲なので問題ない
+            flat = spec_db.ravel()
+            k5 = int(0.05 * (flat.size - 1))
+            k99 = int(0.99 * (flat.size - 1))
+            part = np.partition(flat, (k5, k99))
+            # 0.1dB単位に丸める。表示クリップ範囲としては無差で、
+            # ショット間でほぼ同じスペクトルならNormalizeキャッシュに
+            # 当たるようになる
+            vmin = round(float(part[k5]), 1)
+            vmax = round(float(part[k99]), 1)
+
+        # vmin/vmaxを直接渡すと図ごとにNormalizeが作り直される。
+        # バッチでは同じクリップ範囲 (固定c_lim指定が典型) を何枚も
+        # 使い回すので、(vmin, vmax) ごとにキャッシュして渡す
+        key = (float(vmin), float(vmax))
+        norm = self._norm_cache.get(key)
+        if norm is None:
+            norm = Normalize(vmin=key[0], vmax=key[1])
+            self._norm_cache[key] = norm
+
+        # gouraudの頂点色補間はAggのラスタライズが重く、フラット
+        # シェーディングの数倍かかる。ビン幅は出力1px程度まで間引き済み
+        # なので補間してもしなくても見た目は変わらない
+        mesh = ax.pcolormesh(t, f, spec_db, cmap=opts.get('cmap', 'jet'), shading='auto', norm=norm)
         
         cax_width = 0.02
         cax_left = margin_right + 0.02
         cax_bottom = margin_bottom
         cax_height = margin_top - margin_bottom
         cax = fig.add_axes([cax_left, cax_bottom, cax_width, cax_height])
-        plt.colorbar(mesh, cax=cax, label=opts.get('c_label', "Power [dB]"))
+        # plt.colorbarはgcf()基準なので、Figureを使い回す構成では
+        # 対象のfigを明示する
+        fig.colorbar(mesh, cax=cax, label=opts.get('c_label', "Power [dB]"))
         
         # ★修正: タイトルを下に配置
         ax.set_title(task.get('title', target), y=-0.18) # -0.22 -> -0.18
@@ -330,13 +716,9 @@ class Visualizer:
         ax.tick_params(which='both', top=True, right=True, direction='in')
 
         save_name = f"{shot_name}_STFT_{target}.png" if shot_name else f"STFT_{target}.png"
-        plt.savefig(os.path.join(self.figures_dir, save_name), dpi=300)
-        
-        # ★ここを変更: close()せずにshow()する
-        plt.show()
-        # plt.close()
-        
-        print(f"    🌈 STFT描画: {save_name} (Unit: {freq_unit})")
+        save_path = self._savefig(fig, os.path.join(self.figures_dir, save_name), opts)
+        self._finalize_figure(fig)
+        print(f"    🌈 STFT描画: {os.path.basename(save_path)} (Unit: {freq_unit})")
 
     def _plot_coasting_fit(self, data_store, task, shot_name="UnknownShot"):
         target = task.get('target')
@@ -346,13 +728,17 @@ class Visualizer:
             
         sensor = data_store[target]
         t_all = sensor.time
-        y_all = sensor.data.copy()
-        
+
         title = task.get('title', 'Coasting Analysis')
         opts = task.get('plot_options', {})
-        
+
+        # フィッタも描画も読み取りのみなのでコピーは不要。rpm換算の
+        # ときだけ乗算で新しい配列ができる (_plot_timeseriesと同じ方針)
         freq_unit = opts.get('frequency_unit', 'Hz')
-        if freq_unit.lower() == 'rpm': y_all = y_all * 60.0
+        if freq_unit.lower() == 'rpm':
+            y_all = sensor.data * 60.0
+        else:
+            y_all = sensor.data
         
         fit_range = task.get('fit_range', [0, 1])
         result = self.fitter.fit(t_all, y_all, fit_range=fit_range)
@@ -378,7 +764,7 @@ class Visualizer:
         figsize = (7, 5)
         if opts.get('aspect_ratio') == 'square': figsize = (6, 6)
 
-        fig, ax = plt.subplots(figsize=figsize)
+        fig, ax = self._get_figure(figsize)
         fig.subplots_adjust(left=margin_left, right=margin_right, bottom=margin_bottom, top=margin_top)
         
         series_styles = opts.get('series_styles', {})
@@ -463,13 +849,9 @@ class Visualizer:
         
         safe_title = title.replace(" ", "_").replace("/", "-")
         save_name = f"{shot_name}_CoastingFit.png"
-        plt.savefig(os.path.join(self.figures_dir, save_name), dpi=300)
-        
-        # ★ここを変更: close()せずにshow()する
-        plt.show()
-        # plt.close()
-        
-        print(f"    📈 保存: {save_name}")
+        save_path = self._savefig(fig, os.path.join(self.figures_dir, save_name), opts)
+        self._finalize_figure(fig)
+        print(f"    📈 保存: {os.path.basename(save_path)}")
 
     def _plot_scatter(self, task):
         """
@@ -502,7 +884,7 @@ class Visualizer:
         elif opts.get('aspect_ratio') == 'square': 
             figsize = (6, 6)
 
-        fig, ax = plt.subplots(figsize=figsize)
+        fig, ax = self._get_figure(figsize)
         fig.subplots_adjust(left=margin_left, right=margin_right, bottom=margin_bottom, top=margin_top)
 
         # プロット
@@ -561,10 +943,6 @@ class Visualizer:
         # 保存
         safe_title = title.replace(" ", "_").replace("/", "-")
         save_name = f"{safe_title}.png"
-        plt.savefig(os.path.join(self.figures_dir, save_name), dpi=300)
-        
-        # ★ここを変更: close()せずにshow()する
-        plt.show()
-        # plt.close()
-        
-        print(f"    🔵 散布図保存: {save_name}")
\ No newline at end of file
+        save_path = self._savefig(fig, os.path.join(self.figures_dir, save_name), opts)
+        self._finalize_figure(fig)
+        print(f"    🔵 散布図保存: {os.path.basename(save_path)}")
\ No newline at end of file